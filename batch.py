@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Batch generation of sundials for many locations.
+
+Reads a CSV or JSON list of locations, and renders horizontal, analemmatic,
+vertical, polar and/or equatorial sundials for each one to SVG, PDF and/or
+PNG files, without a display, fanning the work out across a pool of
+processes.
+
+CSV files have a header row naming the columns latitude, longitude, timezone
+and location. JSON files hold a list of objects with those keys, or a list of
+[latitude, longitude, timezone, location] lists.
+
+With --trim-hours, hour lines that are never lit, as found by
+sun_times.lit_hour_range() for all the locations at once, are left out.
+
+Output is byte-identical whatever the number of worker processes.
+
+With --layout-cache, computed layouts are kept in a directory shared by
+the worker processes (see layout_cache.py), so rendering the same dials
+again, after a change of style, skips their geometry.
+
+With --profile, the time spent in each stage--solar math, geometry, date
+scale, artist construction and file writing--is recorded by instrument.py,
+in all the worker processes, and printed as a table; --trace also writes it
+as a Chrome trace.
+
+Dependencies:
+    - NumPy
+    - matplotlib
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import json
+import os
+import re
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from dial_geometry import Location
+import dial_layout
+from dials import DIAL_MODULES
+import instrument
+import layout_cache
+import sun_times
+
+FORMATS = ('svg', 'pdf', 'png')
+
+# Leave out the creation date, and use a fixed salt for SVG element ids, so
+# output files are reproducible.
+SVG_HASH_SALT = 'sundials'
+SAVE_METADATA = {
+    'svg': {'Date': None},
+    'pdf': {'CreationDate': None},
+    'png': {},
+}
+
+# Figures are reused from one dial to the next within a worker process, one per dial type.
+_figures = {}
+# Layout caches, per (directory, max bytes), within a worker process.
+_layout_caches = {}
+
+
+def read_locations(path):
+    """Read a list of Locations from a CSV or JSON file."""
+    with open(path, newline='') as f:
+        if path.lower().endswith('.json'):
+            records = json.load(f)
+        else:
+            records = list(csv.DictReader(f))
+    locations = []
+    for record in records:
+        if isinstance(record, dict):
+            record = (record['latitude'], record['longitude'], record['timezone'], record['location'])
+        (latitude, longitude, timezone, location) = record
+        locations.append(Location(float(latitude), float(longitude), float(timezone), location))
+    return locations
+
+
+def output_name(index, location, dial_name):
+    """File name, without extension, for one dial of a batch."""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', location.location).strip('_')
+    return '%05d_%s_%s' % (index, slug, dial_name)
+
+
+def render_dial(job):
+    """Render one dial to each of the requested formats.
+    Returns (index, dial name, location name, seconds taken, output paths)."""
+    (index, location, dial_name, formats, output_dir, hour_range, cache_settings) = job
+    start_time = time.perf_counter()
+
+    fig = _figures.get(dial_name)
+    if fig is None:
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        _figures[dial_name] = fig
+    fig.clear()
+    cache = None
+    if cache_settings is not None:
+        cache = _layout_caches.get(cache_settings)
+        if cache is None:
+            cache = _layout_caches[cache_settings] = layout_cache.LayoutCache(*cache_settings)
+    layout = layout_cache.cached_layout(cache, DIAL_MODULES[dial_name].__name__, location, *hour_range)
+    dial_layout.draw_layout(fig, layout)
+
+    paths = []
+    with matplotlib.rc_context({'svg.hashsalt': SVG_HASH_SALT}):
+        for file_format in formats:
+            path = os.path.join(output_dir, '%s.%s' % (output_name(index, location, dial_name), file_format))
+            with instrument.stage('savefig.%s' % file_format, 'write'):
+                fig.savefig(path, format=file_format, metadata=SAVE_METADATA[file_format])
+            paths.append(path)
+    return (index, dial_name, location.location, time.perf_counter() - start_time, paths)
+
+
+def _render_dial_profiled(job):
+    """As render_dial(), in a worker process recording instrumentation.
+    Returns (result, events recorded)."""
+    return (render_dial(job), instrument.drain())
+
+
+def render_batch(locations, dial_names=('horiz', 'analemmatic'), formats=('svg',), output_dir='.', workers=None,
+                 trim_hours=False, cache_directory=None, cache_max_bytes=layout_cache.DEFAULT_MAX_BYTES):
+    """Render dials for a list of Locations, across workers processes
+    (or in this process if workers is 1). If trim_hours is True, hour lines
+    that are never lit are left out. If cache_directory is given, layouts
+    are cached there, up to cache_max_bytes. If instrumentation is enabled,
+    the worker processes' events are collected into this process.
+    Returns a list of per-dial results, as from render_dial()."""
+    os.makedirs(output_dir, exist_ok=True)
+    if trim_hours and locations:
+        hour_ranges = [(int(hour_line_min), int(hour_line_max))
+                       for (hour_line_min, hour_line_max) in zip(*sun_times.lit_hour_range(locations))]
+    else:
+        hour_ranges = [(None, None)] * len(locations)
+    cache_settings = None if cache_directory is None else (cache_directory, cache_max_bytes)
+    jobs = [(index, location, dial_name, tuple(formats), output_dir, hour_ranges[index], cache_settings)
+            for (index, location) in enumerate(locations)
+            for dial_name in dial_names]
+    if workers == 1:
+        return [render_dial(job) for job in jobs]
+    chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+    if not instrument.enabled():
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(render_dial, jobs, chunksize=chunksize))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=instrument.enable) as executor:
+        for (result, events) in executor.map(_render_dial_profiled, jobs, chunksize=chunksize):
+            results.append(result)
+            instrument.merge(events)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render sundials for a list of locations.")
+    parser.add_argument('locations', help="CSV or JSON file of locations")
+    parser.add_argument('-d', '--dial', action='append', choices=sorted(DIAL_MODULES),
+                        help="dial type to render (default all); may be repeated")
+    parser.add_argument('-f', '--format', action='append', choices=FORMATS,
+                        help="output file format (default svg); may be repeated")
+    parser.add_argument('-o', '--output-dir', default='.', help="directory for output files")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="number of worker processes (default one per CPU)")
+    parser.add_argument('--trim-hours', action='store_true', help="leave out hour lines that are never lit")
+    parser.add_argument('--layout-cache', metavar='DIRECTORY', help="directory in which to cache dial layouts")
+    parser.add_argument('--layout-cache-size', type=float, default=layout_cache.DEFAULT_MAX_BYTES / 2**20,
+                        metavar='MB', help="maximum size of the layout cache (default %(default)g MB)")
+    parser.add_argument('--profile', action='store_true', help="print the time spent in each stage")
+    parser.add_argument('--trace', metavar='PATH', help="write the time spent in each stage as a Chrome trace JSON file")
+    args = parser.parse_args()
+
+    if args.profile or args.trace:
+        instrument.enable()
+    locations = read_locations(args.locations)
+    start_time = time.perf_counter()
+    results = render_batch(locations,
+                           dial_names=args.dial or sorted(DIAL_MODULES),
+                           formats=args.format or ('svg',),
+                           output_dir=args.output_dir,
+                           workers=args.workers,
+                           trim_hours=args.trim_hours,
+                           cache_directory=args.layout_cache,
+                           cache_max_bytes=int(args.layout_cache_size * 2**20))
+    for (index, dial_name, location_name, seconds, paths) in results:
+        print("%5d  %-12s %-40s %8.3f s" % (index, dial_name, location_name, seconds))
+    print("%d dials in %.3f s" % (len(results), time.perf_counter() - start_time))
+    if args.profile:
+        print(instrument.summary())
+    if args.trace:
+        instrument.write_chrome_trace(args.trace)
+
+
+if __name__ == '__main__':
+    main()
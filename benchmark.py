@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the sundial calculations and rendering.
+
+Each benchmark is timed over scalar, 1e3 and 1e7-element inputs where that
+makes sense, and the results are saved as JSON, so they can be compared
+across commits:
+
+    python benchmark.py run -o before.json
+    (change something)
+    python benchmark.py run -o after.json
+    python benchmark.py compare before.json after.json --threshold 1.2
+
+compare exits with status 1 if any benchmark is slower by more than the
+threshold ratio.
+
+Dependencies:
+    - NumPy
+    - SciPy (for the eccentric_anomaly_fsolve benchmark)
+    - matplotlib (for the matplotlib rendering benchmarks)
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+
+
+SIZES = (1, 1000, 10**7)
+REPEAT = 5
+# Aim for each timing sample to take at least this long, in seconds.
+MIN_SAMPLE_TIME = 0.05
+
+# List of (name, size, setup), where setup() returns the function to be timed.
+BENCHMARKS = []
+
+
+def benchmark(name, sizes=(None,)):
+    """Decorator registering setup(size) as a benchmark, for each of sizes."""
+    def register(setup):
+        for size in sizes:
+            BENCHMARKS.append((name, size, setup))
+        return setup
+    return register
+
+
+def day_numbers(size):
+    """Day numbers spread over several years, as a scalar or an array of size elements."""
+    if size == 1:
+        return 123.4
+    return np.linspace(-1000, 1000, size)
+
+
+@benchmark('eccentric_anomaly', SIZES)
+def bench_eccentric_anomaly(size):
+    import equation_of_time
+    mean_anomaly_value = equation_of_time.mean_anomaly(day_numbers(size))
+    return lambda: equation_of_time.eccentric_anomaly(mean_anomaly_value)
+
+
+@benchmark('eccentric_anomaly_fsolve', SIZES[:2])
+def bench_eccentric_anomaly_fsolve(size):
+    import equation_of_time
+    mean_anomaly_value = equation_of_time.mean_anomaly(day_numbers(size))
+    return lambda: equation_of_time.eccentric_anomaly_fsolve(mean_anomaly_value)
+
+
+@benchmark('equation_of_time_accurate', SIZES)
+def bench_equation_of_time_accurate(size):
+    import equation_of_time
+    days = day_numbers(size)
+    return lambda: equation_of_time.equation_of_time_accurate(days)
+
+
+@benchmark('equation_of_time_accurate_bulk_float32', SIZES)
+def bench_equation_of_time_accurate_bulk_float32(size):
+    import equation_of_time
+    days = day_numbers(size)
+    out = np.empty(np.shape(days), dtype=np.float32)
+    return lambda: equation_of_time.equation_of_time_accurate_bulk(days, out=out)
+
+
+def _threaded_bulk(size, workers):
+    import equation_of_time
+    days = day_numbers(size)
+    out = np.empty(np.shape(days))
+    return lambda: equation_of_time.equation_of_time_accurate_bulk(days, out=out, workers=workers)
+
+
+# Scaling of the threaded bulk evaluation, from 1 to all CPUs.
+for _workers in sorted(set([1, 2, 4, os.cpu_count() or 1])):
+    benchmark('equation_of_time_accurate_bulk_threads%d' % _workers, SIZES[-1:])(
+        lambda size, w=_workers: _threaded_bulk(size, w))
+
+
+@benchmark('equation_of_time_simple', SIZES)
+def bench_equation_of_time_simple(size):
+    import equation_of_time
+    days = day_numbers(size)
+    return lambda: equation_of_time.equation_of_time_simple(days)
+
+
+@benchmark('equation_of_time_fourier', SIZES)
+def bench_equation_of_time_fourier(size):
+    import equation_of_time
+    days = day_numbers(size)
+    return lambda: equation_of_time.equation_of_time_fourier(days)
+
+
+@benchmark('sun_declination_simple', SIZES)
+def bench_sun_declination_simple(size):
+    import sun_declination
+    days = day_numbers(size)
+    return lambda: sun_declination.sun_declination_simple(days)
+
+
+@benchmark('horiz_hour_angle', SIZES)
+def bench_horiz_hour_angle(size):
+    import horiz
+    hours = 12.5 if size == 1 else np.linspace(0, 24, size)
+    return lambda: horiz.horiz_hour_angle(hours, horiz.LOCATION)
+
+
+def _shadow_measurements(size):
+    """Shadow angles on a horizontal dial, from 9 am to 3 pm, and dates through a year."""
+    import horiz
+    hours = 12.5 if size == 1 else np.linspace(9, 15, size)
+    dates = np.datetime64('2009-06-01') if size == 1 else np.datetime64('2009-01-01') + np.arange(size) % 365
+    return (horiz.dial_hour_angle(hours, horiz.LOCATION), dates)
+
+
+@benchmark('horiz_clock_time', SIZES)
+def bench_horiz_clock_time(size):
+    import dial_reader
+    import horiz
+    (shadow_angle, dates) = _shadow_measurements(size)
+    return lambda: dial_reader.horiz_clock_time(shadow_angle, dates, horiz.LOCATION)
+
+
+@benchmark('analemmatic_clock_time', SIZES)
+def bench_analemmatic_clock_time(size):
+    import analemmatic
+    import dial_reader
+    (shadow_angle, dates) = _shadow_measurements(size)
+    return lambda: dial_reader.analemmatic_clock_time(shadow_angle, dates, analemmatic.LOCATION)
+
+
+@benchmark('analemmatic_date_scale')
+def bench_analemmatic_date_scale(size):
+    import analemmatic
+    return lambda: analemmatic.date_scale(analemmatic.LOCATION)
+
+
+@benchmark('layout_horiz')
+def bench_layout_horiz(size):
+    import horiz
+    return lambda: horiz.layout(horiz.LOCATION)
+
+
+@benchmark('layout_analemmatic')
+def bench_layout_analemmatic(size):
+    import analemmatic
+    return lambda: analemmatic.layout(analemmatic.LOCATION)
+
+
+def _matplotlib_render(dial_name, file_format):
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    import analemmatic
+    import horiz
+
+    dial_module = horiz if dial_name == 'horiz' else analemmatic
+    fig = Figure()
+    FigureCanvasAgg(fig)
+
+    def render():
+        fig.clear()
+        dial_module.draw_dial(fig, dial_module.LOCATION)
+        fig.savefig(io.BytesIO(), format=file_format)
+    return render
+
+
+def _vector_render(dial_name, file_format):
+    import analemmatic
+    import horiz
+    import vector_writer
+
+    dial_module = horiz if dial_name == 'horiz' else analemmatic
+    writer = vector_writer.WRITERS[file_format]
+
+    def render():
+        writer(dial_module.layout(dial_module.LOCATION), io.StringIO())
+    return render
+
+
+for _dial_name in ('horiz', 'analemmatic'):
+    for _file_format in ('png', 'svg', 'pdf'):
+        benchmark('render_%s_matplotlib_%s' % (_dial_name, _file_format))(
+            lambda size, d=_dial_name, f=_file_format: _matplotlib_render(d, f))
+    for _file_format in ('svg', 'dxf'):
+        benchmark('render_%s_vector_%s' % (_dial_name, _file_format))(
+            lambda size, d=_dial_name, f=_file_format: _vector_render(d, f))
+
+
+def result_key(name, size):
+    return name if size is None else '%s[%d]' % (name, size)
+
+
+def time_function(function, repeat=REPEAT):
+    """Time function(), returning seconds per call as (min, median, calls per sample)."""
+    timer = timeit.Timer(function)
+    (number, sample_time) = timer.autorange()
+    number = max(1, int(np.ceil(number * MIN_SAMPLE_TIME / max(sample_time, 1e-9))))
+    samples = np.array(timer.repeat(repeat=repeat, number=number)) / number
+    return (float(np.min(samples)), float(np.median(samples)), number)
+
+
+def environment():
+    """Description of where the benchmarks ran."""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+
+def run(pattern=None, max_size=None, repeat=REPEAT):
+    """Run the benchmarks whose names match the regular expression pattern.
+    Returns a dict suitable for saving as JSON."""
+    results = {}
+    for (name, size, setup) in BENCHMARKS:
+        if pattern and not re.search(pattern, name):
+            continue
+        if max_size and size and size > max_size:
+            continue
+        key = result_key(name, size)
+        (minimum, median, number) = time_function(setup(size), repeat)
+        results[key] = {'min': minimum, 'median': median, 'number': number, 'repeat': repeat}
+        print("%-45s %12.3g s  (median %.3g s)" % (key, minimum, median))
+        sys.stdout.flush()
+    return {'environment': environment(), 'results': results}
+
+
+def compare(before, after, threshold):
+    """Compare two sets of results. Returns a list of the keys of benchmarks
+    that are slower than threshold times the before time."""
+    slower = []
+    for (key, result) in sorted(after['results'].items()):
+        if key not in before['results']:
+            continue
+        ratio = result['min'] / before['results'][key]['min']
+        flag = ''
+        if ratio > threshold:
+            flag = 'SLOWER'
+            slower.append(key)
+        elif ratio < 1 / threshold:
+            flag = 'faster'
+        print("%-45s %12.3g s -> %12.3g s  x%6.2f  %s" % (key, before['results'][key]['min'], result['min'], ratio, flag))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the sundial calculations and rendering.")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    run_parser = subparsers.add_parser('run', help="run benchmarks")
+    run_parser.add_argument('-o', '--output', help="JSON file to save the results to")
+    run_parser.add_argument('-k', '--filter', help="only run benchmarks whose names match this regular expression")
+    run_parser.add_argument('--max-size', type=int, help="skip array sizes larger than this")
+    run_parser.add_argument('--repeat', type=int, default=REPEAT, help="number of timing samples")
+    compare_parser = subparsers.add_parser('compare', help="compare two saved results")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--threshold', type=float, default=1.2,
+                                help="ratio of after to before time counted as a slowdown (default 1.2)")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run(args.filter, args.max_size, args.repeat)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        with open(args.before) as f:
+            before = json.load(f)
+        with open(args.after) as f:
+            after = json.load(f)
+        slower = compare(before, after, args.threshold)
+        if slower:
+            print("%d benchmark(s) slower by more than x%g" % (len(slower), args.threshold))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Automatic hour range and extents for sundials, for any location.
+
+The hour lines needed are those covering the earliest sunrise and the latest
+sunset of the year, in clock time, as from sun_times.hour_range(). The hour
+lines show mean time, so the equation of time is not included.
+
+The extents are found from the geometry of the dial's layout, which is
+computed anyway, so no rendering is needed to check that everything fits.
+
+Dependencies:
+    - NumPy
+"""
+
+import numpy as np
+
+import dial_geometry
+import sun_times
+
+
+# Margin, in dial units, around the contents of a dial. It leaves room for
+# the text of the labels, whose positions are their centres.
+EXTENT_MARGIN = 0.08
+# Points per ellipse arc, when finding its extent.
+ARC_SAMPLES = 361
+
+
+def hour_line_range(location):
+    """Clock hours (hour_line_min, hour_line_max) of the first and last hour
+    lines for location, covering the earliest sunrise and latest sunset of the
+    year. location is a Location or Site, or a sequence of Locations, to find
+    the ranges for many locations at once."""
+    return sun_times.hour_range(location, covering=True)
+
+
+def layout_points(layout):
+    """Every point of a dial_layout.DialLayout's contents, as (x, y) arrays."""
+    points = [(line.x0, line.y0) for line in layout.hour_lines + layout.date_scale_lines]
+    points += [(line.x1, line.y1) for line in layout.hour_lines + layout.date_scale_lines]
+    points += [(label.x, label.y) for label in layout.numerals + layout.date_scale_labels]
+    points += list(layout.hour_points)
+    for polyline in layout.date_lines:
+        points += list(polyline)
+    if layout.gnomon is not None:
+        points += [(layout.gnomon.x0, layout.gnomon.y0), (layout.gnomon.x1, layout.gnomon.y1)]
+    if layout.compass is not None:
+        arrow = layout.compass.arrow
+        points += [(layout.compass.label.x, layout.compass.label.y),
+                   (arrow.x, arrow.y), (arrow.x + arrow.dx, arrow.y + arrow.dy)]
+    (x, y) = np.array(points, dtype=float).reshape(-1, 2).T
+    if layout.ellipse_arc is not None:
+        (rx, ry, rotation, start, sweep) = dial_geometry.ellipse_arc_parameters(layout.ellipse_arc)
+        (arc_x, arc_y) = dial_geometry.ellipse_arc_points(layout.ellipse_arc,
+                                                       np.linspace(start, start + sweep, ARC_SAMPLES))
+        (x, y) = (np.concatenate([x, arc_x]), np.concatenate([y, arc_y]))
+    return (x, y)
+
+
+def layout_bounds(layout, margin=EXTENT_MARGIN):
+    """Tight bounding box (x min, x max, y min, y max) of a layout's contents, plus margin."""
+    (x, y) = layout_points(layout)
+    return (x.min() - margin, x.max() + margin, y.min() - margin, y.max() + margin)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Geometry shared by the sundial generators.
+
+The hour angle of the sun, the southern hemisphere rotation and the compass
+are common to all the dials. The ellipse arc parameters are shared by the
+dial extents and the vector writer. For dials whose hour lines are the
+shadow of a style parallel to the earth's axis--horizontal, vertical,
+declining, reclining, polar and equatorial dials--plane_hour_lines() gives
+the hour lines on a plane of any orientation, as one array calculation over
+hours, locations and orientations.
+
+A Site holds a Location with the quantities derived from it--the sine and
+cosine of the latitude, the longitude in radians, the longitude correction
+and the analemmatic ellipse axes--computed once. site_for() returns the
+Site for a Location from a bounded cache, so repeated calls for the same
+place cost only a cache lookup. The dial functions take either.
+
+Vectors are in the local horizon frame: x east, y north, z up. A plane's
+orientation is given by its declination--the direction its face looks,
+clockwise from south (positive to the west), in degrees--and its
+inclination from horizontal, in degrees. A horizontal plane has inclination
+0 and a vertical wall 90. On the plane, the dial's x axis is horizontal, to
+the right as the dial is viewed, and the y axis is up the plane; for a
+horizontal plane with declination 0, they are east and north.
+
+References:
+    http://en.wikipedia.org/wiki/Sundial
+    http://en.wikipedia.org/wiki/Sundial#Vertical_declining_dials
+
+Dependencies:
+    - NumPy
+"""
+
+from collections import namedtuple
+import functools
+
+import numpy as np
+
+from dial_layout import Arrow, Compass, Label
+import equation_of_time
+import sun_declination
+
+
+# Named tuple to hold geographic location
+Location = namedtuple('Location', 'latitude, longitude, timezone, location')
+
+# Orientation of a dial's plane, in degrees. The fields may be arrays.
+Plane = namedtuple('Plane', 'declination, inclination')
+
+# Declinations of the sun at which hour lines are tested for being lit.
+LIT_DECLINATION_SAMPLES = 17
+# Number of Sites kept by site_for(), least recently used first out.
+SITE_CACHE_SIZE = 1024
+# Semi-major axis of an analemmatic dial's ellipse.
+ELLIPSE_MAJOR_AXIS = 1.0
+
+
+class Site(object):
+    """A Location, with the quantities derived from it computed once.
+
+    Has the fields of a Location, so can be passed wherever one is. The
+    fields may be arrays, as from location_grid(). clock_offset_min is the
+    offset of local mean solar time from clock time, in minutes.
+
+    Sites are shared through the cache of site_for(), so their attributes
+    are read-only.
+    """
+    __slots__ = ('latitude', 'longitude', 'timezone', 'location',
+                 'latitude_rad', 'sin_latitude', 'cos_latitude', 'longitude_rad', 'clock_offset_min',
+                 'ellipse_major_axis', 'ellipse_minor_axis')
+
+    def __init__(self, location):
+        (latitude, longitude, timezone, location_name) = location
+        latitude_rad = np.deg2rad(latitude)
+        sin_latitude = np.sin(latitude_rad)
+        values = {
+            'latitude': latitude,
+            'longitude': longitude,
+            'timezone': timezone,
+            'location': location_name,
+            'latitude_rad': latitude_rad,
+            'sin_latitude': sin_latitude,
+            'cos_latitude': np.cos(latitude_rad),
+            'longitude_rad': np.deg2rad(longitude),
+            'clock_offset_min': equation_of_time.clock_offset_min(longitude, timezone),
+            'ellipse_major_axis': ELLIPSE_MAJOR_AXIS,
+            'ellipse_minor_axis': ELLIPSE_MAJOR_AXIS * sin_latitude,
+        }
+        for (name, value) in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Site attributes are read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("Site attributes are read-only")
+
+    def __reduce__(self):
+        # Rebuild from the Location, for pickling and copying.
+        return (Site, (self.as_location(),))
+
+    def as_location(self):
+        return Location(self.latitude, self.longitude, self.timezone, self.location)
+
+    def __repr__(self):
+        return 'Site(%r)' % (self.as_location(),)
+
+
+_cached_site = functools.lru_cache(maxsize=SITE_CACHE_SIZE)(Site)
+
+
+def site_for(location):
+    """The Site for a Location (or a Site, which is returned as it is).
+    Sites of Locations with scalar fields are cached; those with array
+    fields, which can't be hashed, are built each time."""
+    if isinstance(location, Site):
+        return location
+    try:
+        return _cached_site(location)
+    except TypeError:
+        return Site(location)
+
+
+def mean_solar_noon(location):
+    """Clock time (in hours) of mean solar noon at location, from the
+    longitude correction. The fields of location may be arrays."""
+    return np.asarray(12 - site_for(location).clock_offset_min / 60)
+
+
+def location_grid(locations):
+    """Given a sequence of Locations, return one Location whose fields are
+    column arrays of shape (N, 1). Passed to the hour angle functions along
+    with an array of hours, the results broadcast to shape (N, hours)."""
+    (latitude, longitude, timezone, location) = zip(*locations)
+    return Location(np.array(latitude, dtype=float)[:, np.newaxis],
+                    np.array(longitude, dtype=float)[:, np.newaxis],
+                    np.array(timezone, dtype=float)[:, np.newaxis],
+                    np.array(location, dtype=object)[:, np.newaxis])
+
+
+def equatorial_hour_angle(hour, location):
+    """Midnight is angle 0.
+    6 am is angle pi/2.
+    midday is angle pi.
+    etc.
+    hour and the fields of location may be arrays, and are broadcast together."""
+    site = site_for(location)
+    return (hour - site.timezone) * 2 * np.pi / 24 + site.longitude_rad
+
+
+def southern_rotation(latitude):
+    """Rotation (in rad) applied to dials in the southern hemisphere: 180
+    degrees, so "up" is consistently from the sundial viewer's perspective
+    with the sun behind their shoulder."""
+    return np.where(np.asarray(latitude) < 0, np.pi, 0.)
+
+
+def southern_sign(latitude):
+    """-1 in the southern hemisphere, 1 in the northern: the 180 degree
+    rotation of southern_rotation() as a factor on coordinates."""
+    return np.where(np.asarray(latitude) < 0, -1, 1)
+
+
+def north_compass(x, y_min, y_max, length, latitude, width=0.08):
+    """A compass arrow and "N" label in the band y_min to y_max at x, pointing
+    up in the northern hemisphere, and down in the southern (where the dial
+    is rotated by 180 degrees)."""
+    if latitude >= 0:
+        return Compass(Label(x, y_max, "N", 'center', 'center'), Arrow(x, y_min, 0, length, width))
+    else:
+        return Compass(Label(x, y_min, "N", 'center', 'center'), Arrow(x, y_max, 0, -length, width))
+
+
+def ellipse_arc_parameters(arc):
+    """Given a dial_layout.EllipseArc, with matplotlib's conventions, return
+    (rx, ry, rotation, start, sweep): the semi-axes, the rotation of the x axis
+    (rad), and the anticlockwise parametric angles (rad) of the arc."""
+    rx = arc.width / 2
+    ry = arc.height / 2
+    theta1 = np.deg2rad(arc.theta1)
+    theta2 = np.deg2rad(arc.theta2)
+    # matplotlib gives the arc's end angles as geometric angles on the ellipse;
+    # convert them to parametric angles.
+    if ry != 0:
+        theta1 = np.arctan2(rx / ry * np.sin(theta1), np.cos(theta1))
+        theta2 = np.arctan2(rx / ry * np.sin(theta2), np.cos(theta2))
+    if ry < 0:
+        # A negative height mirrors the ellipse, which reverses the direction of the arc.
+        (theta1, theta2) = (-theta2, -theta1)
+    sweep = (theta2 - theta1) % (2 * np.pi)
+    if sweep == 0:
+        sweep = 2 * np.pi
+    return (rx, abs(ry), np.deg2rad(arc.angle), theta1, sweep)
+
+
+def ellipse_arc_points(arc, parameters):
+    """Points (x, y arrays) on a dial_layout.EllipseArc at the given parametric angles."""
+    (rx, ry, rotation, start, sweep) = ellipse_arc_parameters(arc)
+    x = rx * np.cos(parameters)
+    y = ry * np.sin(parameters)
+    return (x * np.cos(rotation) - y * np.sin(rotation), x * np.sin(rotation) + y * np.cos(rotation))
+
+
+def _dot(a, b):
+    return np.sum(a * b, axis=-1)
+
+
+def celestial_pole(latitude):
+    """Unit vector towards the north celestial pole, along the earth's axis."""
+    latitude = np.deg2rad(latitude)
+    return np.stack(np.broadcast_arrays(0., np.cos(latitude), np.sin(latitude)), axis=-1)
+
+
+def sun_direction(hour_angle, declination, latitude):
+    """Unit vector towards the sun, at hour_angle (in rad, from solar noon,
+    positive in the afternoon) and declination (in rad)."""
+    latitude = np.deg2rad(latitude)
+    return np.stack(np.broadcast_arrays(
+        -np.cos(declination) * np.sin(hour_angle),
+        np.sin(declination) * np.cos(latitude) - np.cos(declination) * np.cos(hour_angle) * np.sin(latitude),
+        np.sin(declination) * np.sin(latitude) + np.cos(declination) * np.cos(hour_angle) * np.cos(latitude)), axis=-1)
+
+
+def plane_axes(plane):
+    """Unit vectors (normal, x axis, y axis) of a Plane: the normal out of
+    its face, and the dial's x and y axes on it."""
+    declination = np.deg2rad(plane.declination)
+    inclination = np.deg2rad(plane.inclination)
+    normal = np.stack(np.broadcast_arrays(-np.sin(declination) * np.sin(inclination),
+                                          -np.cos(declination) * np.sin(inclination),
+                                          np.cos(inclination)), axis=-1)
+    x_axis = np.stack(np.broadcast_arrays(np.cos(declination), -np.sin(declination), 0.), axis=-1)
+    return (normal, x_axis, np.cross(normal, x_axis))
+
+
+def substyle(location, plane):
+    """Direction (x, y) on the dial of the substyle--the style's projection onto
+    the plane--from the style's foot, and the style's height (its angle above
+    the plane, in rad). For an equatorial dial the direction is (0, 0)."""
+    (normal, x_axis, y_axis) = plane_axes(plane)
+    pole = celestial_pole(location.latitude)
+    pole_normal = _dot(pole, normal)
+    # The style points to whichever celestial pole is above the plane.
+    style = pole * np.where(pole_normal < 0, -1, 1)[..., np.newaxis]
+    return ((_dot(style, x_axis), _dot(style, y_axis)), np.arcsin(np.abs(pole_normal)))
+
+
+def plane_hour_lines(hour, location, plane, style_height=0.):
+    """Hour lines on a plane, for clock hours hour.
+
+    The style runs parallel to the earth's axis. It meets the plane at the
+    dial's origin, and the hour lines radiate from there; except for a plane
+    parallel to the earth's axis (a polar dial), where the style is
+    style_height above the origin, and the hour lines are parallel.
+
+    Returns (x0, y0, dx, dy, lit): each hour line passes through (x0, y0),
+    and the shadow falls along the unit direction (dx, dy) from there. lit is
+    whether the sun, at some time of year, is both up and in front of the
+    plane at that hour. hour, the fields of location and the fields of plane
+    may be arrays, and are broadcast together.
+    """
+    hour_angle = equatorial_hour_angle(hour, location) - np.pi
+    (normal, x_axis, y_axis) = plane_axes(plane)
+    pole = celestial_pole(location.latitude)
+    # The sun's direction at the equinoxes. At other times of year, the sun
+    # is in the same plane through the style--the hour plane.
+    equinox_sun = sun_direction(hour_angle, 0., location.latitude)
+    (pole, equinox_sun, normal, x_axis, y_axis) = np.broadcast_arrays(pole, equinox_sun, normal, x_axis, y_axis)
+    pole_normal = _dot(pole, normal)
+    sun_normal = _dot(equinox_sun, normal)
+
+    # The hour line is where the hour plane meets the dial's plane. It points
+    # away from the sun from where the style meets the plane, or, for a polar
+    # dial, along the style.
+    direction = pole * sun_normal[..., np.newaxis] - equinox_sun * pole_normal[..., np.newaxis]
+    polar = np.isclose(pole_normal, 0)
+    sign = np.where(polar, np.where(sun_normal < 0, -1, 1), np.where(pole_normal < 0, -1, 1))
+    direction *= sign[..., np.newaxis]
+    direction /= np.linalg.norm(direction, axis=-1, keepdims=True)
+
+    # For a polar dial, a point on the line: the shadow, at the equinoxes, of
+    # the point of the style above the origin.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shadow = style_height * (normal - equinox_sun / sun_normal[..., np.newaxis])
+    point = np.where(polar[..., np.newaxis], shadow, 0.)
+
+    # Lit if the sun is up and in front of the plane, at some declination.
+    declinations = np.linspace(-sun_declination.SUN_OBLIQUITY, sun_declination.SUN_OBLIQUITY, LIT_DECLINATION_SAMPLES)
+    sun = sun_direction(np.asarray(hour_angle)[..., np.newaxis], declinations,
+                        np.asarray(location.latitude, dtype=float)[..., np.newaxis])
+    lit = np.any((sun[..., 2] > 0) & (_dot(sun, normal[..., np.newaxis, :]) > 0), axis=-1)
+
+    return (_dot(point, x_axis), _dot(point, y_axis), _dot(direction, x_axis), _dot(direction, y_axis), lit)
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+The sundial types, by name.
+
+Each is a module with a layout(location, ...) function giving a
+dial_layout.DialLayout, and a default LOCATION. A new dial type is added
+here to be available to batch.py and vector_writer.py.
+
+Dependencies:
+    - NumPy
+"""
+
+import analemmatic
+import equatorial
+import horiz
+import polar
+import vertical
+
+
+DIAL_MODULES = {
+    'horiz': horiz,
+    'analemmatic': analemmatic,
+    'vertical': vertical,
+    'polar': polar,
+    'equatorial': equatorial,
+}
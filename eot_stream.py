@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Streaming calculation of the solar time correction for unbounded feeds of
+timestamped rows.
+
+Rows of (UTC timestamp, site ID) are consumed in fixed-size chunks, from an
+iterator, a CSV file or a stream of .npy arrays, and each chunk's equation of
+time and clock offset is calculated with array arithmetic. The clock offset
+is equation_of_time.clock_offset_min(): the offset of local mean solar time
+from clock time, for the site's actual time zone. Results are
+yielded chunk by chunk, so memory use stays constant however long the feed.
+
+A .npy record stream is a sequence of .npy arrays written one after another
+to the same file, as by repeated numpy.save() calls. It can be written to,
+and read from, a pipe; on standard input, it is told from CSV by the .npy
+magic string. The stream ends cleanly only at an array boundary; a truncated
+or damaged array is an error.
+
+Site IDs are at most SITE_ID_LENGTH characters. A longer one, or one not in
+the sites file, is an error.
+
+Dependencies:
+    - NumPy
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import sys
+import time
+
+import numpy as np
+
+import dial_geometry
+from dial_geometry import Location
+import equation_of_time
+import solar_position
+
+
+CHUNK_SIZE = 65536
+SITE_ID_LENGTH = 32
+
+INPUT_DTYPE = np.dtype([('timestamp', 'datetime64[us]'), ('site', 'U%d' % SITE_ID_LENGTH)])
+OUTPUT_DTYPE = np.dtype([
+    ('timestamp', 'datetime64[us]'),
+    ('site', 'U%d' % SITE_ID_LENGTH),
+    ('equation_of_time_min', 'f8'),
+    ('clock_offset_min', 'f8'),
+    ('solar_offset_min', 'f8'),
+])
+
+
+def read_sites(path):
+    """Read a CSV file of sites, with columns site_id, longitude and timezone,
+    and optionally latitude, which the correction doesn't depend on.
+    Returns a dict of site ID to dial_geometry.Site."""
+    sites = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            location = Location(float(row.get('latitude') or 0), float(row['longitude']), float(row['timezone']),
+                                row['site_id'])
+            sites[row['site_id']] = dial_geometry.site_for(location)
+    return sites
+
+
+def iter_chunks(rows, chunk_size=CHUNK_SIZE):
+    """Group an iterator of (timestamp, site ID) rows into record arrays of INPUT_DTYPE."""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        for (timestamp, site_id) in chunk:
+            if len(site_id) > SITE_ID_LENGTH:
+                raise ValueError("site ID %r is longer than %d characters" % (site_id, SITE_ID_LENGTH))
+        yield np.array(chunk, dtype=INPUT_DTYPE)
+
+
+def _csv_row(row, line_number):
+    if len(row) < 2:
+        raise ValueError("line %d: expected a timestamp and a site ID" % line_number)
+    return (row[0].rstrip('Z'), row[1])
+
+
+def read_csv_chunks(f, chunk_size=CHUNK_SIZE):
+    """Read chunks of rows from a CSV file with a header row, whose first two
+    columns are the ISO 8601 UTC timestamp and the site ID."""
+    reader = csv.reader(f)
+    next(reader, None)
+    return iter_chunks((_csv_row(row, reader.line_num) for row in reader), chunk_size)
+
+
+def _read_exactly(f, size):
+    """Read size bytes from f, which may return fewer per read, as a pipe does.
+    Returns fewer only at the end of the file."""
+    parts = []
+    while size > 0:
+        part = f.read(size)
+        if not part:
+            break
+        parts.append(part)
+        size -= len(part)
+    return b''.join(parts)
+
+
+def read_npy_array(f):
+    """Read the next array of a .npy record stream from f, without seeking,
+    so f may be a pipe. Returns None at the end of the stream; raises
+    ValueError if an array is truncated or isn't a valid .npy array."""
+    magic = _read_exactly(f, np.lib.format.MAGIC_LEN)
+    if not magic:
+        return None
+    if len(magic) < np.lib.format.MAGIC_LEN:
+        raise ValueError("truncated .npy array header")
+    version = np.lib.format.read_magic(io.BytesIO(magic))
+    if version == (1, 0):
+        (shape, fortran_order, dtype) = np.lib.format.read_array_header_1_0(f)
+    elif version == (2, 0):
+        (shape, fortran_order, dtype) = np.lib.format.read_array_header_2_0(f)
+    else:
+        raise ValueError("unsupported .npy format version %d.%d" % version)
+    if dtype.hasobject:
+        raise ValueError(".npy arrays of Python objects are not supported")
+    size = int(np.prod(shape)) * dtype.itemsize
+    payload = _read_exactly(f, size)
+    if len(payload) < size:
+        raise ValueError("truncated .npy array: expected %d bytes of data, got %d" % (size, len(payload)))
+    return np.frombuffer(payload, dtype=dtype).reshape(shape, order='F' if fortran_order else 'C')
+
+
+def read_npy_chunks(f, chunk_size=CHUNK_SIZE):
+    """Read chunks of rows from a .npy record stream of arrays with 'timestamp' and 'site' fields."""
+    while True:
+        array = read_npy_array(f)
+        if array is None:
+            return
+        if array.dtype.names is None or not {'timestamp', 'site'} <= set(array.dtype.names):
+            raise ValueError(".npy record stream arrays need 'timestamp' and 'site' fields")
+        for start in range(0, len(array), chunk_size):
+            yield array[start:start + chunk_size]
+
+
+def is_npy_stream(f):
+    """Whether the buffered binary file f starts with the .npy magic string, without consuming it."""
+    return f.peek(len(np.lib.format.MAGIC_PREFIX))[:len(np.lib.format.MAGIC_PREFIX)] == np.lib.format.MAGIC_PREFIX
+
+
+def process(chunks, sites):
+    """Calculate the solar time correction for each chunk of rows.
+
+    sites is a dict of site ID to dial_geometry.Site, as from read_sites().
+    Yields record arrays of OUTPUT_DTYPE. Raises ValueError for site IDs
+    that are too long, or not in sites.
+    """
+    for chunk in chunks:
+        # Look up each distinct site once per chunk.
+        (site_ids, site_index) = np.unique(chunk['site'], return_inverse=True)
+        too_long = [str(site_id) for site_id in site_ids if len(site_id) > SITE_ID_LENGTH]
+        if too_long:
+            raise ValueError("site IDs longer than %d characters: %s" % (SITE_ID_LENGTH, ', '.join(too_long)))
+        unknown = [str(site_id) for site_id in site_ids if str(site_id) not in sites]
+        if unknown:
+            raise ValueError("unknown site IDs: %s" % ', '.join(unknown))
+        site_offsets = np.array([sites[str(site_id)].clock_offset_min for site_id in site_ids])
+
+        result = np.empty(len(chunk), dtype=OUTPUT_DTYPE)
+        result['timestamp'] = chunk['timestamp']
+        result['site'] = chunk['site']
+        result['equation_of_time_min'] = equation_of_time.equation_of_time(solar_position.day_number(chunk['timestamp']))
+        result['clock_offset_min'] = site_offsets[site_index.ravel()]
+        np.add(result['equation_of_time_min'], result['clock_offset_min'], out=result['solar_offset_min'])
+        yield result
+
+
+def write_csv(results, f):
+    """Write result chunks to a CSV file."""
+    writer = csv.writer(f)
+    writer.writerow(OUTPUT_DTYPE.names)
+    for result in results:
+        writer.writerows(zip(result['timestamp'].astype(str), result['site'],
+                             *(np.char.mod('%.6f', result[name]) for name in OUTPUT_DTYPE.names[2:])))
+
+
+def write_npy(results, f):
+    """Write result chunks to a .npy record stream."""
+    for result in results:
+        np.save(f, result)
+
+
+def counted(results, stats):
+    """Pass result chunks through, counting rows into stats['rows']."""
+    for result in results:
+        stats['rows'] += len(result)
+        yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attach solar time corrections to a feed of timestamped rows.")
+    parser.add_argument('sites', help="CSV file of sites, with columns site_id, longitude and timezone")
+    parser.add_argument('input', help="input .csv or .npy record stream, or - for either on stdin")
+    parser.add_argument('output', help="output .csv or .npy record stream, or - for CSV on stdout")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    sites = read_sites(args.sites)
+    if args.input == '-' and is_npy_stream(sys.stdin.buffer):
+        input_file = sys.stdin.buffer
+        chunks = read_npy_chunks(input_file, args.chunk_size)
+    elif args.input.endswith('.npy'):
+        input_file = open(args.input, 'rb')
+        chunks = read_npy_chunks(input_file, args.chunk_size)
+    else:
+        input_file = sys.stdin if args.input == '-' else open(args.input, newline='')
+        chunks = read_csv_chunks(input_file, args.chunk_size)
+
+    stats = {'rows': 0}
+    start_time = time.perf_counter()
+    results = counted(process(chunks, sites), stats)
+    try:
+        if args.output.endswith('.npy'):
+            with open(args.output, 'wb') as f:
+                write_npy(results, f)
+        elif args.output == '-':
+            write_csv(results, sys.stdout)
+        else:
+            with open(args.output, 'w', newline='') as f:
+                write_csv(results, f)
+    except ValueError as e:
+        sys.exit("%s: error: %s" % (parser.prog, e))
+    finally:
+        input_file.close()
+
+    seconds = time.perf_counter() - start_time
+    sys.stderr.write("%d rows in %.3f s, %.0f rows/s\n" % (stats['rows'], seconds, stats['rows'] / max(seconds, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
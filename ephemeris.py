@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Long-term calculation of the sun's position, over arbitrary date ranges.
+
+equation_of_time.py and sun_declination.py use a fixed periapsis date, a
+fixed solstice date and fixed orbital constants, which suit one year around
+2009. Here the mean anomaly is measured from each year's own periapsis, and
+the eccentricity, obliquity and longitude of periapsis follow their secular
+drift, as polynomials in Julian centuries from J2000.0. This keeps the
+equation of time and declination good over centuries.
+
+Long ranges, such as a century at minute resolution, are processed in chunks
+by solar_position_range(), so memory use stays bounded.
+
+References:
+    Jean Meeus, "Astronomical Algorithms", chapters 22 and 25
+    http://en.wikipedia.org/wiki/Equation_of_time
+
+Dependencies:
+    - NumPy
+"""
+
+import numpy as np
+
+import equation_of_time
+from solar_position import SolarPosition
+
+
+J2000 = np.datetime64('2000-01-01T12:00', 'us')
+DAYS_PER_JULIAN_CENTURY = 36525.
+
+# Number of dates per chunk in solar_position_range(). Each chunk needs
+# roughly 100 bytes of working memory per date.
+CHUNK_SIZE = 1 << 20
+
+
+def julian_centuries(dates):
+    """Given an array of datetimes (or datetime64), in UTC, return Julian
+    centuries from J2000.0. The difference between UTC and terrestrial time
+    (about a minute) is ignored."""
+    dates = np.asarray(dates, dtype='datetime64[us]')
+    return (dates - J2000) / np.timedelta64(1, 'D') / DAYS_PER_JULIAN_CENTURY
+
+
+def sun_eccentricity(t):
+    """Eccentricity of the earth's orbit, given Julian centuries from J2000.0."""
+    return 0.016708634 - t * (0.000042037 + t * 0.0000001267)
+
+
+def sun_obliquity(t):
+    """Obliquity of the ecliptic (in rad), given Julian centuries from J2000.0."""
+    return np.deg2rad(23.439291111 - t * (0.013004167 + t * (0.00000016389 - t * 0.00000050361)))
+
+
+def sun_angle_offset(t):
+    """The angle (in rad) from the vernal equinox to the periapsis in the plane
+    of the ecliptic, given Julian centuries from J2000.0."""
+    return np.deg2rad(282.93735 + t * (1.71946 + t * 0.00046))
+
+
+def mean_anomaly(t):
+    """Mean anomaly (in rad), given Julian centuries from J2000.0.
+    This is the angle travelled since the current year's periapsis."""
+    return np.deg2rad(357.52911 + t * (35999.05029 - t * 0.0001537))
+
+
+def solar_position(dates):
+    """Calculate the sun's position, given an array of datetimes (or datetime64), in UTC.
+    Returns a solar_position.SolarPosition."""
+    t = julian_centuries(dates)
+    eccentricity = sun_eccentricity(t)
+    obliquity = sun_obliquity(t)
+    angle_offset = sun_angle_offset(t)
+
+    mean_anomaly_value = mean_anomaly(t)
+    eccentric_anomaly_value = equation_of_time.eccentric_anomaly_newton(mean_anomaly_value, eccentricity=eccentricity)
+    true_anomaly_value = equation_of_time.true_anomaly(eccentric_anomaly_value, eccentricity)
+
+    sun_angle = true_anomaly_value + angle_offset
+    sun_angle_x = np.cos(sun_angle)
+    sun_angle_y = np.sin(sun_angle)
+    right_ascension_value = np.arctan2(sun_angle_y * np.cos(obliquity), sun_angle_x)
+    declination_value = np.arcsin(sun_angle_y * np.sin(obliquity))
+
+    eot = mean_anomaly_value + angle_offset - right_ascension_value
+    # Get the angles into the range we want--that is, -pi to +pi
+    eot = (eot + np.pi) % (2 * np.pi) - np.pi
+    return SolarPosition(eot * (24 * 60 / 2 / np.pi), declination_value, right_ascension_value, true_anomaly_value)
+
+
+def solar_position_range(start, end, step=np.timedelta64(1, 'm'), chunk_size=CHUNK_SIZE):
+    """Calculate the sun's position over the dates from start up to end, every step.
+    Yields (dates, SolarPosition) for chunks of up to chunk_size dates."""
+    start = np.datetime64(start, 'us')
+    end = np.datetime64(end, 'us')
+    step = np.timedelta64(step, 'us')
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + step * chunk_size, end)
+        dates = np.arange(chunk_start, chunk_end, step)
+        yield (dates, solar_position(dates))
+        chunk_start = chunk_end
+
+
+def _solve_dates(years, month_day, function, target, rate, iterations=5):
+    """Newton iteration for the dates, near month_day of each year, at which
+    function(t) reaches target (mod 2 pi). rate is the approximate d function / dt."""
+    years = np.asarray(years)
+    guesses = np.array(['%04d-%s' % (year, month_day) for year in years.ravel()], dtype='datetime64[us]').reshape(years.shape)
+    t = julian_centuries(guesses)
+    for _ in range(iterations):
+        difference = (function(t) - target + np.pi) % (2 * np.pi) - np.pi
+        t = t - difference / rate
+    return J2000 + (t * DAYS_PER_JULIAN_CENTURY * 86400e6).astype('timedelta64[us]')
+
+
+def periapsis_dates(years):
+    """Dates (datetime64, UTC) of the mean periapsis in each of an array of years."""
+    return _solve_dates(years, '01-03', mean_anomaly, 0, np.deg2rad(35999.05029))
+
+
+def _sun_longitude(t):
+    """The angle (in rad) from the vernal equinox to the sun, given Julian centuries from J2000.0."""
+    eccentricity = sun_eccentricity(t)
+    eccentric_anomaly_value = equation_of_time.eccentric_anomaly_newton(mean_anomaly(t), eccentricity=eccentricity)
+    return equation_of_time.true_anomaly(eccentric_anomaly_value, eccentricity) + sun_angle_offset(t)
+
+
+def solstice_dates(years, month=12):
+    """Dates (datetime64, UTC) of the June (month 6) or December (month 12)
+    solstice in each of an array of years."""
+    if month == 6:
+        return _solve_dates(years, '06-21', _sun_longitude, np.pi / 2, np.deg2rad(36000.76983))
+    return _solve_dates(years, '12-21', _sun_longitude, 3 * np.pi / 2, np.deg2rad(36000.76983))
+
+
+def main():
+    years = np.arange(2000, 2031)
+    for (year, periapsis, solstice) in zip(years, periapsis_dates(years), solstice_dates(years)):
+        print("%d  periapsis %s  December solstice %s" % (year, periapsis.astype('datetime64[m]'), solstice.astype('datetime64[m]')))
+
+    # Extremes of the equation of time over a century, at minute resolution.
+    eot_min = np.inf
+    eot_max = -np.inf
+    for (dates, position) in solar_position_range('1950-01-01', '2050-01-01'):
+        eot_min = min(eot_min, position.equation_of_time.min())
+        eot_max = max(eot_max, position.equation_of_time.max())
+    print("Equation of time 1950-2050 ranges from %.2f to %.2f min" % (eot_min, eot_max))
+
+
+if __name__ == '__main__':
+    main()
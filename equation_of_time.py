@@ -11,16 +11,17 @@ Calculations have been done according to the Wikipedia reference.
 Dependencies:
     - Python 2.x
     - NumPy
-    - SciPy (only strictly needed for the more accurate calculation)
+    - SciPy (only needed for the fsolve reference solver, eccentric_anomaly_fsolve())
     - matplotlib to plot the graph
 """
 
 import datetime
 from collections import namedtuple
+import functools
 
 import numpy as np
-import scipy            # only strictly needed for the more accurate calculation in equation_of_time_accurate()
-import scipy.optimize
+
+import instrument
 
 # Named tuple to hold geographic location
 Location = namedtuple('Location', 'latitude, longitude, location')
@@ -44,6 +45,22 @@ SUN_ANGLE_OFFSET = 4.9358
 SUN_OBLIQUITY = 0.40910
 
 
+# Convergence criteria for the array-native Kepler solver. With the Sun's small
+# eccentricity, Newton iteration converges to this tolerance in 3 or 4 steps.
+KEPLER_TOLERANCE = 1e-12
+KEPLER_MAX_ITERATIONS = 10
+
+# Elements per block in the bulk functions. The few temporary arrays of each
+# block are small enough to stay mostly in the CPU cache, and peak memory is
+# the output plus a few blocks, whatever the input size.
+BULK_BLOCK_SIZE = 1 << 16
+# Elements per chunk handed to each thread by the bulk functions, when using several workers.
+PARALLEL_CHUNK_SIZE = 1 << 20
+
+# Samples per year of equation_of_time_accurate(), for fitting Fourier series.
+FOURIER_SAMPLES = 256
+
+
 # Date range for drawing a graph.
 DATE_START = datetime.date(2009, 1, 1)
 DATE_END = datetime.date(2010, 1, 1)
@@ -69,13 +86,50 @@ def longitude_offset_min(location):
     return longitude_offset(location) * minute_per_longitude
 
 
+def clock_offset_min(longitude, timezone):
+    """Offset (in min) of local mean solar time from clock time, due to
+    longitude away from the time zone's meridian. timezone is in hours.
+    Unlike longitude_offset_min(), this uses the actual time zone, rather than
+    the nearest whole-hour meridian."""
+    return longitude * (24 * 60 / 360.) - timezone * 60
+
+
 def mean_anomaly(day_number_n):
     """day_number_n is the number of days from periapsis."""
     return day_number_n * (2 * np.pi / DAYS_PER_TROPICAL_YEAR)
 
 
+@instrument.timed('solar', sized=True)
+def eccentric_anomaly_newton(mean_anomaly_value, tolerance=KEPLER_TOLERANCE, max_iterations=KEPLER_MAX_ITERATIONS,
+                             eccentricity=None):
+    """Solve Kepler's equation, M = E - e sin(E), for the eccentric anomaly E.
+
+    Newton iteration is applied to the whole array at once, stopping when every
+    element's correction is within tolerance (in rad) or after max_iterations.
+    Agrees with eccentric_anomaly_fsolve() to within 1e-10 rad.
+    eccentricity defaults to SUN_ECCENTRICITY, and may be an array.
+    """
+    local_sun_eccentricity = SUN_ECCENTRICITY if eccentricity is None else eccentricity
+
+    mean_anomaly_value = np.asarray(mean_anomaly_value, dtype=float)
+    # Starting guess from the first-order series expansion in eccentricity.
+    eccentric_anomaly_value = mean_anomaly_value + local_sun_eccentricity * np.sin(mean_anomaly_value)
+    for _ in range(max_iterations):
+        residual = eccentric_anomaly_value - local_sun_eccentricity * np.sin(eccentric_anomaly_value) - mean_anomaly_value
+        delta = residual / (1 - local_sun_eccentricity * np.cos(eccentric_anomaly_value))
+        eccentric_anomaly_value -= delta
+        if np.all(np.abs(delta) <= tolerance):
+            break
+    return eccentric_anomaly_value
+
+
+@instrument.timed('solar', 'equation_of_time.eccentric_anomaly_fsolve', sized=True)
 @np.vectorize
-def eccentric_anomaly(mean_anomaly_value):
+def eccentric_anomaly_fsolve(mean_anomaly_value):
+    """Reference solver for Kepler's equation, one scipy.optimize.fsolve() call per element.
+    Much slower than eccentric_anomaly_newton()."""
+    import scipy.optimize
+
     local_sun_eccentricity = SUN_ECCENTRICITY
 
     def eccentric_anomaly_function(eccentric_anomaly_value):
@@ -83,16 +137,20 @@ def eccentric_anomaly(mean_anomaly_value):
 
 #    eccentric_anomaly_value = scipy.optimize.brentq(eccentric_anomaly_function, 0 - 0.0001, 2 * np.pi + 0.0001)
     eccentric_anomaly_value = scipy.optimize.fsolve(eccentric_anomaly_function, mean_anomaly_value)
-    return eccentric_anomaly_value
+    return eccentric_anomaly_value[0]
 
 
-def true_anomaly(eccentric_anomaly_value):
-    local_sun_eccentricity = SUN_ECCENTRICITY
+#eccentric_anomaly = eccentric_anomaly_fsolve
+eccentric_anomaly = eccentric_anomaly_newton
+
+
+def true_anomaly(eccentric_anomaly_value, eccentricity=None):
+    """eccentricity defaults to SUN_ECCENTRICITY, and may be an array."""
+    local_sun_eccentricity = SUN_ECCENTRICITY if eccentricity is None else eccentricity
 
     half_eccentric_anomaly = eccentric_anomaly_value / 2
     a_x = np.cos(half_eccentric_anomaly)
-    a_y = np.sin(half_eccentric_anomaly)
-    a_y *= np.sqrt((1 + local_sun_eccentricity) / (1 - local_sun_eccentricity))
+    a_y = np.sin(half_eccentric_anomaly) * np.sqrt((1 + local_sun_eccentricity) / (1 - local_sun_eccentricity))
     return 2 * np.arctan2(a_y, a_x)
 
 
@@ -104,6 +162,7 @@ def right_ascension(sun_angle):
     return np.arctan2(a_y * np.cos(SUN_OBLIQUITY), a_x)
 
 
+@instrument.timed('solar', sized=True)
 def equation_of_time_accurate(day_number_n):
     """Calculate the equation of time (in min), given a day number.
     
@@ -121,6 +180,117 @@ def equation_of_time_accurate(day_number_n):
     return eot * (24 * 60 / 2 / np.pi)
 
 
+def bulk_evaluate(block_function, values, out=None, dtype=np.float64, block_size=BULK_BLOCK_SIZE,
+                  workers=1, chunk_size=PARALLEL_CHUNK_SIZE):
+    """Apply block_function(values_block, out_block), which must write its
+    result into out_block, to values in blocks of block_size elements.
+    out is a C-contiguous array the shape of values, or None to allocate one
+    of dtype. Returns out.
+
+    With workers > 1 (or None, for one per CPU), chunks of chunk_size elements
+    are evaluated on a pool of threads, each writing its own part of out; the
+    NumPy ufuncs release the GIL. Chunks are whole numbers of blocks, so the
+    results are identical to those with one worker.
+    """
+    values = np.asarray(values)
+    if out is None:
+        out = np.empty(values.shape, dtype=dtype)
+    elif out.shape != values.shape or not out.flags.c_contiguous:
+        raise ValueError("out must be a C-contiguous array of shape %s" % (values.shape,))
+    values_flat = values.reshape(-1)
+    out_flat = out.reshape(-1)
+
+    def evaluate_chunk(start, stop):
+        for block_start in range(start, stop, block_size):
+            block_stop = min(block_start + block_size, stop)
+            block_function(values_flat[block_start:block_stop], out_flat[block_start:block_stop])
+
+    if workers == 1 or values_flat.size <= chunk_size:
+        evaluate_chunk(0, values_flat.size)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        import os
+
+        chunk_size = max(1, -(-chunk_size // block_size)) * block_size
+        # ThreadPoolExecutor's own default is more threads than CPUs.
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            futures = [executor.submit(evaluate_chunk, start, min(start + chunk_size, values_flat.size))
+                       for start in range(0, values_flat.size, chunk_size)]
+            for future in futures:
+                future.result()
+    return out
+
+
+def elementwise_block(function):
+    """Block function, for bulk_evaluate(), from an element-wise function such as equation_of_time_simple()."""
+    def block_function(values_block, out_block):
+        out_block[...] = function(values_block)
+    return block_function
+
+
+def _equation_of_time_accurate_block(day_number_block, out):
+    """equation_of_time_accurate() of a block, computed in out with three
+    temporaries of its size and dtype."""
+    mean_anomaly_value = out
+    # Reducing to within a year first, in the input's precision, keeps float32 results accurate.
+    np.remainder(day_number_block, DAYS_PER_TROPICAL_YEAR, out=mean_anomaly_value, casting='same_kind')
+    mean_anomaly_value *= 2 * np.pi / DAYS_PER_TROPICAL_YEAR
+
+    # Newton iteration for the eccentric anomaly, as eccentric_anomaly_newton().
+    angle = np.sin(mean_anomaly_value)
+    angle *= SUN_ECCENTRICITY
+    angle += mean_anomaly_value
+    delta = np.empty_like(angle)
+    denominator = np.empty_like(angle)
+    tolerance = max(KEPLER_TOLERANCE, 16 * np.finfo(out.dtype).eps)
+    for _ in range(KEPLER_MAX_ITERATIONS):
+        np.sin(angle, out=delta)
+        delta *= -SUN_ECCENTRICITY
+        delta += angle
+        delta -= mean_anomaly_value
+        np.cos(angle, out=denominator)
+        denominator *= -SUN_ECCENTRICITY
+        denominator += 1
+        delta /= denominator
+        angle -= delta
+        if np.all(np.abs(delta, out=delta) <= tolerance):
+            break
+
+    # True anomaly, as true_anomaly().
+    angle *= 0.5
+    np.cos(angle, out=denominator)
+    np.sin(angle, out=angle)
+    angle *= np.sqrt((1 + SUN_ECCENTRICITY) / (1 - SUN_ECCENTRICITY))
+    np.arctan2(angle, denominator, out=angle)
+    angle *= 2
+
+    # Right ascension, as right_ascension().
+    angle += SUN_ANGLE_OFFSET
+    np.cos(angle, out=denominator)
+    np.sin(angle, out=angle)
+    angle *= np.cos(SUN_OBLIQUITY)
+    np.arctan2(angle, denominator, out=angle)
+
+    eot = np.subtract(mean_anomaly_value, angle, out=out)
+    # Get the angles into the range we want--that is, -pi to +pi
+    eot += SUN_ANGLE_OFFSET + np.pi
+    eot %= 2 * np.pi
+    eot -= np.pi
+    eot *= 24 * 60 / 2 / np.pi
+
+
+@instrument.timed('solar', sized=True)
+def equation_of_time_accurate_bulk(day_number_n, out=None, dtype=np.float64, block_size=BULK_BLOCK_SIZE,
+                                  workers=1, chunk_size=PARALLEL_CHUNK_SIZE):
+    """As equation_of_time_accurate(), for large arrays, with the result in
+    dtype (float32 or float64) or written into out. Computed in blocks, so
+    working memory is a few blocks (per worker thread) whatever the size of
+    day_number_n. In float32 the error is within 0.05 s.
+    See bulk_evaluate() for workers and chunk_size."""
+    return bulk_evaluate(_equation_of_time_accurate_block, day_number_n, out, dtype, block_size, workers, chunk_size)
+
+
+@instrument.timed('solar', sized=True)
 def equation_of_time_simple(day_number_n):
     """Calculate the equation of time (in min), given a day number.
     
@@ -132,8 +302,89 @@ def equation_of_time_simple(day_number_n):
     return -7.655 * np.sin(mean_anomaly_value) + 9.873 * np.sin(2 * mean_anomaly_value + 3.588)
 
 
+@functools.lru_cache(maxsize=None)
+def fourier_coefficients(order):
+    """Fourier series coefficients (a, b), of cos and sin of multiples of the
+    mean anomaly up to order, of equation_of_time_accurate() in minutes. The
+    equation of time depends only on the mean anomaly, so is exactly periodic
+    in it, and the series converges quickly. The arrays are shared between
+    calls, so are read-only."""
+    day_numbers = np.arange(FOURIER_SAMPLES) * (DAYS_PER_TROPICAL_YEAR / FOURIER_SAMPLES)
+    coefficients = np.fft.rfft(equation_of_time_accurate(day_numbers))[:order + 1] * (2. / FOURIER_SAMPLES)
+    coefficients[0] /= 2
+    (a, b) = (coefficients.real.copy(), -coefficients.imag)
+    a.flags.writeable = False
+    b.flags.writeable = False
+    return (a, b)
+
+
+@instrument.timed('solar', sized=True)
+def equation_of_time_fourier(day_number_n, order=6):
+    """Calculate the equation of time (in min), given a day number.
+
+    day_number_n is the number of days from periapsis.
+    Returns the difference between solar time and clock time, in minutes.
+    This sums a Fourier series fitted to equation_of_time_accurate(), up to
+    order; order 0 gives the constant mean.
+    """
+    if order < 0:
+        raise ValueError("order must be at least 0")
+    (a, b) = fourier_coefficients(order)
+    if order == 0:
+        return np.full(np.shape(day_number_n), a[0])
+    coefficients = a - 1j * b
+    # Horner's rule in exp(i * mean anomaly), the real part of which is the series.
+    z = np.exp(1j * mean_anomaly(day_number_n))
+    series = np.full(np.shape(z), coefficients[order])
+    for k in range(order - 1, 0, -1):
+        series *= z
+        series += coefficients[k]
+    series *= z
+    return a[0] + series.real
+
+
+# Evaluators of the equation of time, from fastest to slowest, with their
+# maximum error in seconds against equation_of_time_accurate(), over several
+# years of day numbers, and their throughput, in millions of dates per
+# second, measured on a 1e6-element array. Run evaluator_stats() to measure
+# them again.
+Evaluator = namedtuple('Evaluator', 'name, function, max_error_s, throughput_m')
+EVALUATORS = [
+    Evaluator('simple', equation_of_time_simple, 45., 47.),
+    Evaluator('fourier4', functools.partial(equation_of_time_fourier, order=4), 1.3, 31.),
+    Evaluator('fourier6', functools.partial(equation_of_time_fourier, order=6), 0.052, 27.),
+    Evaluator('fourier10', functools.partial(equation_of_time_fourier, order=10), 0.0001, 21.),
+    Evaluator('accurate', equation_of_time_accurate, 0., 6.7),
+]
+
+
+def evaluator_for(max_error_s):
+    """Return the fastest Evaluator whose maximum error is at most max_error_s seconds."""
+    for evaluator in EVALUATORS:
+        if evaluator.max_error_s <= max_error_s:
+            return evaluator
+    return EVALUATORS[-1]
+
+
+def evaluator_stats(size=10**6):
+    """Measure the maximum error (in s) and throughput (in millions of dates
+    per second) of each of EVALUATORS. Returns a list of Evaluators with the
+    measured values."""
+    import timeit
+
+    day_numbers = np.linspace(-2000, 2000, size)
+    reference = equation_of_time_accurate(day_numbers)
+    stats = []
+    for evaluator in EVALUATORS:
+        max_error_s = np.max(np.abs(evaluator.function(day_numbers) - reference)) * 60
+        seconds = min(timeit.repeat(lambda: evaluator.function(day_numbers), number=1, repeat=5))
+        stats.append(evaluator._replace(max_error_s=max_error_s, throughput_m=size / seconds / 1e6))
+    return stats
+
+
 #equation_of_time = equation_of_time_simple
 equation_of_time = equation_of_time_accurate
+#equation_of_time = evaluator_for(1.0).function
 
 
 def main():
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Calculation and generation of equatorial sundial.
+
+The dial's plane is parallel to the equator, and the style, along the
+earth's axis, is perpendicular to it. The hour lines are evenly spaced, 15
+degrees apart, from planar.layout(). The upper face, which is drawn, is lit
+in the summer half of the year.
+
+References:
+    http://en.wikipedia.org/wiki/Sundial#Equatorial_sundials
+
+Dependencies:
+    - NumPy
+    - matplotlib (only to draw the dial)
+"""
+
+from dial_geometry import Location, Plane
+import planar
+
+
+LOCATION = Location(-37.81, 144.96, 10, 'Melbourne, Victoria, Australia')
+
+
+def plane(location):
+    """The Plane of the upper face of an equatorial dial at location."""
+    if location.latitude < 0:
+        return Plane(0, 90 + location.latitude)
+    return Plane(180, 90 - location.latitude)
+
+
+def layout(location, hour_line_min=None, hour_line_max=None, limits=None):
+    """Calculate the layout of the equatorial sundial for location.
+    The hour range defaults to the hours at which the sun can shine on the
+    dial, and limits to fitting the dial's contents.
+    Returns a dial_layout.DialLayout."""
+    return planar.layout(location, plane(location), hour_line_min, hour_line_max, limits, kind='equatorial')
+
+
+draw_dial = planar.dial_drawer(layout)
+
+
+def main():
+    planar.show_dial(draw_dial, LOCATION)
+
+
+if __name__ == '__main__':
+    main()
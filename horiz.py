@@ -8,113 +8,232 @@ References:
 Dependencies:
     - Python 2.x
     - NumPy
-    - matplotlib
+    - matplotlib (only to draw the dial)
 """
 
+import datetime
+import functools
 import logging
-from collections import namedtuple
 import sys
 
-import matplotlib
-#matplotlib.use('pdf')
-#matplotlib.use('svg')
-from matplotlib import pyplot as plt
-from matplotlib import lines
-from matplotlib import text
 import numpy as np
 
-
-logging.basicConfig(stream=sys.stdout, level=logging.INFO)
-
-# Named tuple to hold geographic location
-Location = namedtuple('Location', 'latitude, longitude, timezone, location')
+import dial_extents
+import dial_geometry
+from dial_geometry import Location, equatorial_hour_angle, location_grid
+import dial_layout
+from dial_layout import DialLayout, Label, Segment
+import equation_of_time
+import instrument
+import solar_position
+import sun_declination
 
 
 GNOMON_LENGTH = 0.9
 NUMERAL_OFFSET = 1.07
-EXTENT_MAJOR = 1.15
-EXTENT_MINOR = 0.7
+# The nodus, whose shadow traces the analemma and date lines, is the point on
+# the style above (0, NODUS_LENGTH) on the dial.
+NODUS_LENGTH = 0.35
+# Spacing, in days, of the points of analemma curves.
+ANALEMMA_DAY_STEP = 1.0
+# Date lines are drawn for the solstices and equinoxes, and the start of each month.
+DATE_LINE_MONTH_STARTS = [datetime.date(2009, month_number, 1) for month_number in range(1, 12 + 1)]
+# Date lines are sampled at this many hour angles through the day, and cut
+# off at the length of the hour lines.
+DATE_LINE_SAMPLES = 241
+DATE_LINE_RADIUS = 1.0
+# Number of (latitude, nodus length) date line projections cached.
+DATE_LINE_CACHE_SIZE = 256
 if True:
     LOCATION = Location(-37.81, 144.96, 10, 'Melbourne, Victoria, Australia')
-    HOUR_LINE_MIN = 5
-    HOUR_LINE_MAX = 20
 elif True:
     LOCATION = Location(35.10, 138.86, 9, 'Numazu, Japan')
-    HOUR_LINE_MIN = 4
-    HOUR_LINE_MAX = 19
 else:
     LOCATION = Location(51.3809, -2.3603, 0, 'Bath, England')
-    HOUR_LINE_MIN = 3
-    HOUR_LINE_MAX = 21
-    EXTENT_MAJOR = 1.15
-    EXTENT_MINOR = 1.0
-
-
-def equatorial_hour_angle(hour, location):
-    """Midnight is angle 0.
-    6 am is angle pi/2.
-    midday is angle pi.
-    etc."""
-    equatorial_angle = (hour - location.timezone) * 2 * np.pi / 24 + (np.deg2rad(location.longitude))
-    logging.getLogger("hour.angle.equ").debug("For hour %d, equatorial angle %g" % (hour, np.rad2deg(equatorial_angle)))
-    return equatorial_angle
 
 
 def horiz_hour_angle(hour, location):
-    equatorial_angle = equatorial_hour_angle(hour, location)
+    """location is a Location or dial_geometry.Site.
+    hour and the fields of location may be arrays, and are broadcast together."""
+    site = dial_geometry.site_for(location)
+    equatorial_angle = equatorial_hour_angle(hour, site)
     equatorial_angle_from_solar_noon = equatorial_angle - np.pi
-    logging.getLogger("hour.angle.equ.noon").debug("For hour %d, equatorial angle from solar noon %g" % (hour, equatorial_angle_from_solar_noon * 180 / np.pi))
     # negative (am) is towards the west; positive (pm) towards the east
     a_x = np.cos(equatorial_angle_from_solar_noon)
     a_y = np.sin(equatorial_angle_from_solar_noon)
-    horiz_angle_from_solar_noon = np.arctan2(a_y, a_x / np.sin(np.deg2rad(location.latitude)))
-    logging.getLogger("hour.angle.horiz.noon").debug("For hour %d, horiz angle from solar noon %g" % (hour, np.rad2deg(horiz_angle_from_solar_noon)))
+    horiz_angle_from_solar_noon = np.arctan2(a_y, a_x / site.sin_latitude)
 
     # Angle currently is angle referenced from solar noon, positive (pm) towards the east.
     # Change to mathematical angle, anticlockwise from 0 in the east.
     return np.pi / 2 - horiz_angle_from_solar_noon
 
 
+def dial_hour_angle(hour, location):
+    """Angle of the hour line on the dial, as horiz_hour_angle() but with the
+    southern hemisphere rotation applied.
+    hour and the fields of location may be arrays, and are broadcast together."""
+    return horiz_hour_angle(hour, location) + dial_geometry.southern_rotation(location.latitude)
+
+
+def shadow_position(hour_angle, declination, latitude, nodus_length=NODUS_LENGTH):
+    """Where the shadow of the nodus falls on the dial.
+
+    hour_angle is the solar hour angle from solar noon, positive (pm) towards
+    the west; declination is the sun's declination; latitude is the dial's
+    latitude. All are in rad, and may be arrays, broadcast together.
+    Returns (x, y) arrays, in dial coordinates, NaN where the sun is below the horizon.
+    """
+    # Direction to the sun, with x east, y north and z up.
+    sun_x = -np.cos(declination) * np.sin(hour_angle)
+    sun_y = np.sin(declination) * np.cos(latitude) - np.cos(declination) * np.cos(hour_angle) * np.sin(latitude)
+    sun_z = np.sin(declination) * np.sin(latitude) + np.cos(declination) * np.cos(hour_angle) * np.cos(latitude)
+
+    # The style points up towards the elevated pole.
+    nodus_y = np.copysign(nodus_length, latitude)
+    nodus_z = nodus_length * np.abs(np.tan(latitude))
+    shadow_scale = nodus_z / np.where(sun_z > 0, sun_z, np.nan)
+    x = -sun_x * shadow_scale
+    y = nodus_y - sun_y * shadow_scale
+    rotation = dial_geometry.southern_sign(latitude)
+    return (x * rotation, y * rotation)
+
+
+def analemma(hour, location, day_number_n=None, nodus_length=NODUS_LENGTH):
+    """Analemma curves: where the shadow of the nodus falls at each clock
+    hour, through the year.
+
+    hour is an array of clock hours, for a single location. day_number_n is
+    an array of days from periapsis; by default, one year at ANALEMMA_DAY_STEP.
+    Returns (x, y) arrays, in dial coordinates, of shape hour.shape +
+    day_number_n.shape. Points where the sun is below the horizon are NaN.
+    """
+    if day_number_n is None:
+        day_number_n = np.arange(0, equation_of_time.DAYS_PER_TROPICAL_YEAR, ANALEMMA_DAY_STEP)
+    site = dial_geometry.site_for(location)
+    hour = np.asarray(hour, dtype=float)[..., np.newaxis]
+
+    # Position of the sun at each clock hour on each day (day numbers count from midnight UTC).
+    position = solar_position.solar_position(day_number_n + (hour - site.timezone) / 24)
+    # Solar hour angle, from solar noon, positive (pm) towards the west.
+    hour_angle = equatorial_hour_angle(hour, site) - np.pi + position.equation_of_time * (2 * np.pi / (24 * 60))
+    return shadow_position(hour_angle, position.declination, site.latitude_rad, nodus_length)
+
+
+def date_line_declinations():
+    """Declinations (in rad) of the date lines: the solstices and equinoxes,
+    and the start of each month."""
+    day_numbers = np.array([(month_start - sun_declination.DATE_SOLSTICE).days for month_start in DATE_LINE_MONTH_STARTS])
+    return tuple(np.concatenate(([-sun_declination.SUN_OBLIQUITY, 0, sun_declination.SUN_OBLIQUITY],
+                                 sun_declination.sun_declination(day_numbers))))
+
+
+@functools.lru_cache(maxsize=DATE_LINE_CACHE_SIZE)
+def date_line_projection(latitude, nodus_length=NODUS_LENGTH, declinations=None):
+    """Date lines: where the shadow of the nodus falls through the day, for
+    each of a tuple of declinations (in rad; by default date_line_declinations()).
+
+    latitude is in degrees. Results are cached, keyed by the arguments.
+    Returns read-only (x, y) arrays, in dial coordinates, of shape
+    (len(declinations), DATE_LINE_SAMPLES); points where the sun is below the
+    horizon, or beyond DATE_LINE_RADIUS, are NaN.
+    """
+    if declinations is None:
+        declinations = date_line_declinations()
+    hour_angle = np.linspace(-np.pi, np.pi, DATE_LINE_SAMPLES)
+    (x, y) = shadow_position(hour_angle, np.array(declinations)[:, np.newaxis], np.deg2rad(latitude), nodus_length)
+    outside = ~(np.hypot(x, y) <= DATE_LINE_RADIUS)
+    x[outside] = np.nan
+    y[outside] = np.nan
+    x.flags.writeable = False
+    y.flags.writeable = False
+    return (x, y)
+
+
+@instrument.timed('date scale')
+def date_line_polylines(location, nodus_length=NODUS_LENGTH):
+    """The date lines for location, as a list of polylines, each a list of (x, y) points."""
+    (x, y) = date_line_projection(float(location.latitude), nodus_length)
+    polylines = []
+    for (line_x, line_y) in zip(x, y):
+        # Split each line into its runs of valid points.
+        valid = ~np.isnan(line_x)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], valid.astype(int), [0]))))
+        for (start, end) in zip(edges[::2], edges[1::2]):
+            if end - start >= 2:
+                polylines.append(list(zip(line_x[start:end], line_y[start:end])))
+    return polylines
+
+
+@instrument.timed('geometry')
+def layout(location, hour_line_min=None, hour_line_max=None,
+           extent_major=None, extent_minor=None, date_lines=True):
+    """Calculate the layout of the horizontal sundial for location, with
+    date lines unless date_lines is False.
+    The hour range defaults to covering the earliest sunrise and latest
+    sunset of the year, and the extents to fitting the dial's contents.
+    Returns a dial_layout.DialLayout."""
+    site = dial_geometry.site_for(location)
+    if hour_line_min is None or hour_line_max is None:
+        (auto_hour_line_min, auto_hour_line_max) = dial_extents.hour_line_range(site)
+        hour_line_min = int(auto_hour_line_min) if hour_line_min is None else hour_line_min
+        hour_line_max = int(auto_hour_line_max) if hour_line_max is None else hour_line_max
+    hour_angle_logger = logging.getLogger("hour.angle.horiz")
+    hour_lines = []
+    numerals = []
+    hours = np.arange(hour_line_min, hour_line_max + 1)
+    horiz_angles = dial_hour_angle(hours, site)
+    with instrument.stage('horiz.hour_lines', 'geometry', hours.size):
+        for (hour, horiz_angle) in zip(hours, horiz_angles):
+            hour_angle_logger.info("For hour %d, horiz angle %g", hour, np.rad2deg(horiz_angle))
+            hour_lines.append(Segment(0, 0, np.cos(horiz_angle), np.sin(horiz_angle)))
+            hour_text = "%d" % ((hour - 1) % 12 + 1)
+            numerals.append(Label(np.cos(horiz_angle) * NUMERAL_OFFSET, np.sin(horiz_angle) * NUMERAL_OFFSET, hour_text, 'center', 'center'))
+
+    # The position for the gnomon
+    gnomon = Segment(0, 0, 0, GNOMON_LENGTH)
+
+    # A compass arrow, below the dial's centre
+    compass = dial_geometry.north_compass(0, -0.6, -0.25, 0.3, site.latitude)
+
+    dial = DialLayout(kind='horiz',
+                      location=site.as_location(),
+                      limits=None,
+                      hour_lines=hour_lines,
+                      numerals=numerals,
+                      hour_points=[],
+                      ellipse_arc=None,
+                      date_scale_lines=[],
+                      date_scale_labels=[],
+                      date_lines=date_line_polylines(site) if date_lines else [],
+                      gnomon=gnomon,
+                      compass=compass)
+    if extent_major is None or extent_minor is None:
+        # The dial is centred on the gnomon, extending extent_major to each
+        # side and above, and extent_minor below.
+        (x_min, x_max, y_min, y_max) = dial_extents.layout_bounds(dial)
+        extent_major = max(-x_min, x_max, y_max) if extent_major is None else extent_major
+        extent_minor = -y_min if extent_minor is None else extent_minor
+    return dial._replace(limits=(-extent_major, extent_major, -extent_minor, extent_major))
+
+
+def draw_dial(fig, location, hour_line_min=None, hour_line_max=None,
+              extent_major=None, extent_minor=None, date_lines=True):
+    """Draw the horizontal sundial for location into the matplotlib figure fig.
+    Returns the axes drawn into."""
+    return dial_layout.draw_layout(fig, layout(location, hour_line_min, hour_line_max, extent_major, extent_minor,
+                                               date_lines))
+
+
 def main():
-    fig = plt.figure(num=LOCATION.location)
-#    ax1 = fig.add_subplot(111, aspect='equal')
-    ax1 = fig.add_axes([0, 0, 1.0, 1.0], aspect='equal')
+    #import matplotlib
+    #matplotlib.use('pdf')
+    #matplotlib.use('svg')
+    from matplotlib import pyplot as plt
 
-    hour_angle_logger = logging.getLogger("hour.angle.horiz")
-    for hour in range(HOUR_LINE_MIN, HOUR_LINE_MAX + 1):
-        horiz_angle = horiz_hour_angle(hour, LOCATION)
-        if LOCATION.latitude < 0:
-            # For southern hemisphere, rotate the whole thing around by 180
-            # degrees, so "up" is consistently from the sundial viewer's
-            # perspective with the sun behind their shoulder.
-            horiz_angle += np.deg2rad(180)
-        hour_angle_logger.info("For hour %d, horiz angle %g" % (hour, np.rad2deg(horiz_angle)))
-        line = lines.Line2D([0, np.cos(horiz_angle)], [0, np.sin(horiz_angle)])
-        ax1.add_line(line)
-        hour_text = "%d" % ((hour - 1) % 12 + 1)
-        ax1.add_artist(text.Text(np.cos(horiz_angle) * NUMERAL_OFFSET, np.sin(horiz_angle) * NUMERAL_OFFSET, hour_text, ha='center', va='center'))
-
-    # Draw the position for the gnomon
-    gnomon_line = lines.Line2D([0, 0], [0, GNOMON_LENGTH], color='red')
-    ax1.add_line(gnomon_line)
-
-    # Draw a compass arrow
-    if LOCATION.latitude >= 0:
-        # Up for northern hemisphere
-        ax1.add_artist(text.Text(0, -0.25, "N", ha='center', va='center'))
-        arrow = matplotlib.patches.Arrow(0, -0.6, 0, 0.3, width=0.08, edgecolor='none')
-        ax1.add_patch(arrow)
-    else:
-        # Down for the southern hemisphere
-        ax1.add_artist(text.Text(0, -0.6, "N", ha='center', va='center'))
-        arrow = matplotlib.patches.Arrow(0, -0.25, 0, -0.3, width=0.08, edgecolor='none')
-        ax1.add_patch(arrow)
-
-    #plt.axis('tight')
-    plt.axis('off')
-    
-    plt.xlim(-EXTENT_MAJOR, EXTENT_MAJOR)
-    plt.ylim(-EXTENT_MINOR, EXTENT_MAJOR)
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    fig = plt.figure(num=LOCATION.location)
+    draw_dial(fig, LOCATION)
 
 #    plt.savefig('horiz.pdf')
 #    plt.savefig('horiz.svg')
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Instrumentation of the compute and render stages of the sundial generators.
+
+Stages are timed with stage(), a context manager, or timed(), a function
+decorator, and recorded as events: wall time, and for the solar math the
+number of array elements. The categories are:
+    - solar: the equation of time, Kepler solver and sun's position
+    - geometry: dial layouts, including their hour lines
+    - date scale: analemmatic date scales and horizontal dial date lines
+    - artists: building matplotlib artists from a layout
+    - write: writing output files
+    - cache: reading and writing the layout cache
+
+Recording is off by default, when each timed call costs one flag check.
+Turn it on with enable(), or by setting the SUNDIAL_PROFILE environment
+variable. Events from other processes can be collected with drain() and
+merge(). summary() gives a table of calls and inclusive and self time per
+stage, and write_chrome_trace() a trace for chrome://tracing or Perfetto.
+
+References:
+    https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+
+Dependencies:
+    - NumPy
+"""
+
+from collections import namedtuple
+import functools
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+CATEGORIES = ('solar', 'geometry', 'date scale', 'artists', 'write', 'cache')
+
+# One timed call. start and duration are in ns, from time.perf_counter_ns(),
+# which is system-wide on Linux, so events from worker processes line up.
+# size is the number of array elements processed, or None.
+Event = namedtuple('Event', 'name, category, start, duration, pid, tid, size')
+
+_enabled = bool(os.environ.get('SUNDIAL_PROFILE'))
+_events = []
+
+
+def enable():
+    """Start recording events."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop recording events. Those already recorded are kept."""
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+def events():
+    """The events recorded so far, as a list of Event."""
+    return list(_events)
+
+
+def drain():
+    """Return the events recorded so far, and forget them."""
+    drained = list(_events)
+    del _events[:len(drained)]
+    return drained
+
+
+def merge(new_events):
+    """Add events recorded elsewhere, such as in a worker process."""
+    _events.extend(Event(*event) for event in new_events)
+
+
+def reset():
+    """Forget all recorded events."""
+    del _events[:]
+
+
+class _Stage(object):
+    __slots__ = ('name', 'category', 'size', 'start')
+
+    def __init__(self, name, category, size):
+        self.name = name
+        self.category = category
+        self.size = size
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        _events.append(Event(self.name, self.category, self.start, end - self.start,
+                             os.getpid(), threading.get_native_id(), self.size))
+        return False
+
+
+class _NullStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, category, size=None):
+    """Context manager timing the block within it as one call of stage name,
+    in category, processing size array elements."""
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, category, size)
+
+
+def timed(category, name=None, sized=False):
+    """Decorator timing each call of a function as a stage in category, named
+    name (default the function's module and name). If sized is True, the
+    size of the first argument is recorded as the number of elements."""
+    def decorator(function):
+        stage_name = name or '%s.%s' % (function.__module__, getattr(function, '__name__', type(function).__name__))
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Stage(stage_name, category, int(np.size(args[0])) if sized else None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def self_times(event_list):
+    """Time (in ns) of each event, less the time of the events nested within it,
+    on the same thread."""
+    self_duration = [event.duration for event in event_list]
+    order = sorted(range(len(event_list)),
+                   key=lambda index: (event_list[index].pid, event_list[index].tid,
+                                      event_list[index].start, -event_list[index].duration))
+    # Events enclosing the current one, on the current thread.
+    stack = []
+    thread = None
+    for index in order:
+        event = event_list[index]
+        if (event.pid, event.tid) != thread:
+            (stack, thread) = ([], (event.pid, event.tid))
+        while stack and event.start >= event_list[stack[-1]].start + event_list[stack[-1]].duration:
+            stack.pop()
+        if stack:
+            self_duration[stack[-1]] -= event.duration
+        stack.append(index)
+    return self_duration
+
+
+def summary(event_list=None):
+    """A text table of the calls, total and self time, and elements processed, per stage.
+    Total time includes nested stages; self time does not."""
+    event_list = events() if event_list is None else list(event_list)
+    rows = {}
+    for (event, self_duration) in zip(event_list, self_times(event_list)):
+        row = rows.setdefault((event.category, event.name), [0, 0, 0, 0, None])
+        row[0] += 1
+        row[1] += event.duration
+        row[2] += self_duration
+        row[3] = max(row[3], event.duration)
+        if event.size is not None:
+            row[4] = (row[4] or 0) + event.size
+    lines = ["%-10s %-45s %7s %10s %10s %10s %12s" % ('category', 'stage', 'calls', 'total ms', 'self ms', 'max ms', 'elements')]
+    for ((category, name), (calls, total, self_total, longest, size)) in sorted(
+            rows.items(), key=lambda item: (CATEGORIES.index(item[0][0]) if item[0][0] in CATEGORIES else len(CATEGORIES),
+                                            -item[1][1])):
+        lines.append("%-10s %-45s %7d %10.3f %10.3f %10.3f %12s"
+                     % (category, name, calls, total / 1e6, self_total / 1e6, longest / 1e6,
+                        '' if size is None else '%d' % size))
+    return '\n'.join(lines)
+
+
+def chrome_trace(event_list=None):
+    """The events as a Chrome trace (Trace Event Format) dict of complete events."""
+    event_list = events() if event_list is None else list(event_list)
+    trace_events = []
+    for event in event_list:
+        trace_event = {'name': event.name, 'cat': event.category, 'ph': 'X',
+                       'ts': event.start / 1e3, 'dur': event.duration / 1e3, 'pid': event.pid, 'tid': event.tid}
+        if event.size is not None:
+            trace_event['args'] = {'elements': event.size}
+        trace_events.append(trace_event)
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+
+def write_chrome_trace(path, event_list=None):
+    """Write the events to a Chrome trace JSON file."""
+    with open(path, 'w') as f:
+        json.dump(chrome_trace(event_list), f)
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of computed dial layouts, so dials can be re-rendered--with a
+different style, say--without computing their geometry again.
+
+Layouts are content-addressed: the key is a hash of the dial type, the
+location and layout arguments, the model constants (the upper-case numeric,
+string and date constants of the dial's module and the modules of this
+package it uses, directly or indirectly, found from their imports), and the
+source of those modules. Changing any of them gives a new key, and the
+stale entries age out.
+
+Each layout is one file, in a compact binary format with no pickle: a short
+fixed header, a JSON header with the strings and array shapes, and then the
+coordinates as little-endian float64, 8-byte aligned, so they can be
+memory-mapped. Numbers come back as floats.
+
+The cache directory is bounded to max_bytes, evicting the least recently
+used entries, by file modification time, which is updated on each hit.
+Several processes may share a cache: files are written to a temporary file
+and renamed into place, so readers only ever see whole files, and a file
+that disappears or is damaged is a miss. Each process checks the size of
+the cache once it has written EVICTION_SLACK of max_bytes since the last
+check, so the cache can briefly exceed max_bytes by that much per process.
+
+Dependencies:
+    - NumPy
+"""
+
+import datetime
+import hashlib
+import importlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+import dial_geometry
+from dial_geometry import Location
+from dial_layout import Arrow, Compass, DialLayout, EllipseArc, Label, Segment
+import instrument
+
+
+FORMAT_VERSION = 1
+MAGIC = b'SDLAYOUT'
+# Magic, format version and length of the JSON header.
+_HEADER = struct.Struct('<8sII')
+SUFFIX = '.layout'
+TEMP_SUFFIX = '.tmp'
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Fraction of max_bytes a process writes between checks of the cache size.
+EVICTION_SLACK = 0.1
+# Temporary files older than this (in s) were left by a crashed writer, and are removed.
+STALE_TEMP_SECONDS = 3600
+
+_PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+_model_modules = {}
+_source_digests = {}
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError("%r is not JSON serializable" % (value,))
+
+
+def _is_constant(value):
+    """Whether value is a plain constant, whose representation is stable."""
+    if isinstance(value, (tuple, list)):
+        return all(_is_constant(item) for item in value)
+    return value is None or isinstance(value, (bool, int, float, str, np.generic, datetime.date))
+
+
+def _package_module(value):
+    """The module of this package that value is, or was defined in, or None."""
+    if isinstance(value, types.ModuleType):
+        module = value
+    else:
+        module_name = getattr(value, '__module__', None)
+        module = sys.modules.get(module_name) if isinstance(module_name, str) else None
+    module_file = getattr(module, '__file__', None)
+    if module_file is None or os.path.dirname(os.path.abspath(module_file)) != _PACKAGE_DIRECTORY:
+        return None
+    return module
+
+
+def model_modules(dial_name):
+    """Names of the module dial_name and the modules of this package it uses,
+    directly or indirectly, sorted: those whose constants and source
+    determine its layouts."""
+    names = _model_modules.get(dial_name)
+    if names is None:
+        found = set()
+        pending = [dial_name]
+        while pending:
+            module_name = pending.pop()
+            if module_name in found:
+                continue
+            found.add(module_name)
+            for value in vars(importlib.import_module(module_name)).values():
+                module = _package_module(value)
+                if module is not None:
+                    pending.append(module.__name__)
+        names = _model_modules[dial_name] = tuple(sorted(found))
+    return names
+
+
+def model_constants(module_names):
+    """The upper-case constants of the named modules, as {'module.NAME': value}."""
+    constants = {}
+    for module_name in module_names:
+        module = importlib.import_module(module_name)
+        for (name, value) in vars(module).items():
+            if name.isupper() and _is_constant(value):
+                constants['%s.%s' % (module_name, name)] = value
+    return constants
+
+
+def source_digest(module_names):
+    """SHA-256 of the source files of the named modules, computed once per process."""
+    module_names = tuple(module_names)
+    digest = _source_digests.get(module_names)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for module_name in module_names:
+            with open(importlib.import_module(module_name).__file__, 'rb') as f:
+                hasher.update(f.read())
+        digest = _source_digests[module_names] = hasher.hexdigest()
+    return digest
+
+
+def layout_key(dial_name, location, *args, **kwargs):
+    """Cache key for the layout from the layout() function of module dial_name,
+    called with location, args and kwargs."""
+    module_names = model_modules(dial_name)
+    if isinstance(location, dial_geometry.Site):
+        location = location.as_location()
+    (latitude, longitude, timezone, location_name) = location
+    description = {
+        'format': FORMAT_VERSION,
+        'dial': dial_name,
+        'location': [float(latitude), float(longitude), float(timezone), location_name],
+        'args': args,
+        'kwargs': kwargs,
+        'constants': model_constants(module_names),
+        'source': source_digest(module_names),
+    }
+    text = json.dumps(description, sort_keys=True, default=_json_default)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _rows(values, columns):
+    return np.array(values, dtype='<f8').reshape(-1, columns)
+
+
+def layout_to_bytes(layout):
+    """Serialise a dial_layout.DialLayout to the binary cache format."""
+    arrays = [
+        ('limits', _rows(layout.limits, 4)),
+        ('hour_lines', _rows(layout.hour_lines, 4)),
+        ('numerals', _rows([(label.x, label.y) for label in layout.numerals], 2)),
+        ('hour_points', _rows(list(layout.hour_points), 2)),
+        ('date_scale_lines', _rows(layout.date_scale_lines, 4)),
+        ('date_scale_labels', _rows([(label.x, label.y) for label in layout.date_scale_labels], 2)),
+        ('date_lines', _rows([point for polyline in layout.date_lines for point in polyline], 2)),
+    ]
+    if layout.ellipse_arc is not None:
+        arrays.append(('ellipse_arc', _rows(layout.ellipse_arc, 5)))
+    if layout.gnomon is not None:
+        arrays.append(('gnomon', _rows(layout.gnomon, 4)))
+    if layout.compass is not None:
+        arrays.append(('compass', _rows((layout.compass.label.x, layout.compass.label.y) + tuple(layout.compass.arrow), 7)))
+
+    header = {
+        'kind': layout.kind,
+        'location': list(layout.location),
+        'numerals': [(label.text, label.ha, label.va) for label in layout.numerals],
+        'date_scale_labels': [(label.text, label.ha, label.va) for label in layout.date_scale_labels],
+        'date_line_lengths': [len(polyline) for polyline in layout.date_lines],
+        'compass_label': None if layout.compass is None else layout.compass.label[2:],
+        'arrays': {},
+    }
+    offset = 0
+    for (name, array) in arrays:
+        header['arrays'][name] = (offset,) + array.shape
+        offset += array.size
+    header['size'] = offset
+    header_bytes = json.dumps(header, default=_json_default).encode('utf-8')
+    # Pad the JSON header so the float64 data is 8-byte aligned.
+    header_bytes += b' ' * (-(_HEADER.size + len(header_bytes)) % 8)
+    return b''.join([_HEADER.pack(MAGIC, FORMAT_VERSION, len(header_bytes)), header_bytes]
+                    + [array.tobytes() for (name, array) in arrays])
+
+
+def layout_from_buffer(buffer):
+    """Deserialise a dial_layout.DialLayout from the binary cache format, in
+    bytes or a memory-mapped file. Raises ValueError if it isn't valid."""
+    (magic, version, header_length) = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("not a layout cache file, or of another format version")
+    header = json.loads(bytes(buffer[_HEADER.size:_HEADER.size + header_length]).decode('utf-8'))
+    data = np.frombuffer(buffer, dtype='<f8', count=header['size'], offset=_HEADER.size + header_length)
+    try:
+        arrays = {}
+        for (name, (offset, rows, columns)) in header['arrays'].items():
+            arrays[name] = data[offset:offset + rows * columns].reshape(rows, columns).tolist()
+    finally:
+        # Release the buffer, so a memory map can be closed.
+        del data
+
+    def labels(name):
+        return [Label(x, y, text, ha, va) for ((x, y), (text, ha, va)) in zip(arrays[name], header[name])]
+
+    date_lines = []
+    points = [tuple(point) for point in arrays['date_lines']]
+    for length in header['date_line_lengths']:
+        (polyline, points) = (points[:length], points[length:])
+        date_lines.append(polyline)
+    compass = None
+    if 'compass' in arrays:
+        (label_x, label_y) = arrays['compass'][0][:2]
+        compass = Compass(Label(label_x, label_y, *header['compass_label']), Arrow(*arrays['compass'][0][2:]))
+    return DialLayout(kind=header['kind'],
+                      location=Location(*header['location']),
+                      limits=tuple(arrays['limits'][0]),
+                      hour_lines=[Segment(*line) for line in arrays['hour_lines']],
+                      numerals=labels('numerals'),
+                      hour_points=[tuple(point) for point in arrays['hour_points']],
+                      ellipse_arc=EllipseArc(*arrays['ellipse_arc'][0]) if 'ellipse_arc' in arrays else None,
+                      date_scale_lines=[Segment(*line) for line in arrays['date_scale_lines']],
+                      date_scale_labels=labels('date_scale_labels'),
+                      date_lines=date_lines,
+                      gnomon=Segment(*arrays['gnomon'][0]) if 'gnomon' in arrays else None,
+                      compass=compass)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class LayoutCache(object):
+    """A directory of cached layouts, of at most about max_bytes."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Bytes written since the size of the cache was last checked; None to check on the first write.
+        self.bytes_since_eviction = None
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    @instrument.timed('cache')
+    def get(self, key):
+        """The cached layout for key, or None."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    layout = layout_from_buffer(buffer)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, KeyError, TypeError, struct.error):
+            # A damaged file, such as an empty one
+            _remove(path)
+            self.misses += 1
+            return None
+        # Mark it as recently used.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return layout
+
+    @instrument.timed('cache')
+    def put(self, key, layout):
+        """Store layout for key, evicting old entries if the cache is too big."""
+        data = layout_to_bytes(layout)
+        (fd, temp_path) = tempfile.mkstemp(prefix=key, suffix=TEMP_SUFFIX, dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            _remove(temp_path)
+            raise
+        if self.bytes_since_eviction is None or self.bytes_since_eviction + len(data) > self.max_bytes * EVICTION_SLACK:
+            self.evict()
+        else:
+            self.bytes_since_eviction += len(data)
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is within
+        max_bytes, and stale temporary files. Returns the size of the cache, in bytes."""
+        entries = []
+        total = 0
+        now = time.time()
+        with os.scandir(self.directory) as directory_entries:
+            for entry in directory_entries:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith(TEMP_SUFFIX):
+                    if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                        _remove(entry.path)
+                elif entry.name.endswith(SUFFIX):
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        for (mtime, size, path) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove(path)
+            total -= size
+        self.bytes_since_eviction = 0
+        return total
+
+
+def cached_layout(cache, dial_name, location, *args, **kwargs):
+    """The layout from the layout() function of module dial_name, called with
+    location, args and kwargs: from cache if it's there, and if not,
+    calculated and stored. cache may be None, to always calculate it."""
+    if cache is None:
+        return importlib.import_module(dial_name).layout(location, *args, **kwargs)
+    key = layout_key(dial_name, location, *args, **kwargs)
+    layout = cache.get(key)
+    if layout is None:
+        layout = importlib.import_module(dial_name).layout(location, *args, **kwargs)
+        cache.put(key, layout)
+    return layout
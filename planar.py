@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Calculation and generation of sundials on a plane of any orientation.
+
+The hour lines, numerals and style of a dial on a wall or other plane, from
+dial_geometry.plane_hour_lines(). vertical.py, polar.py and equatorial.py
+choose the plane for their kind of dial, and build their layouts here.
+
+Hour lines are included only for hours at which the sun can shine on the
+dial's face. Where the style meets the plane, the hour lines radiate from
+the dial's origin; on a polar dial, parallel to the earth's axis, they are
+parallel.
+
+dial_drawer() and show_dial() draw the layout of any of these dials, so
+each needs only its plane and layout() function.
+
+References:
+    http://en.wikipedia.org/wiki/Sundial
+
+Dependencies:
+    - NumPy
+    - matplotlib (only to draw the dial)
+"""
+
+import logging
+import sys
+
+import numpy as np
+
+import dial_extents
+import dial_geometry
+from dial_geometry import Location, Plane
+import dial_layout
+from dial_layout import DialLayout, Label, Segment
+import instrument
+
+
+GNOMON_LENGTH = 0.9
+# Numerals are this far beyond the ends of the hour lines.
+NUMERAL_GAP = 0.07
+# Length of the hour lines, from the style's foot; or for a polar dial, either
+# side of the line through the origin.
+HOUR_LINE_LENGTH = 1.0
+POLAR_HOUR_LINE_LENGTH = 0.5
+# Height of the style of a polar dial above the plane, and how far from the
+# noon line hour lines are drawn.
+POLAR_STYLE_HEIGHT = 0.25
+POLAR_EXTENT = 1.0
+
+LOCATION = Location(51.3809, -2.3603, 0, 'Bath, England')
+PLANE = Plane(20, 90)
+
+
+def dial_hours(location, plane, hour_line_min=None, hour_line_max=None, style_height=POLAR_STYLE_HEIGHT):
+    """Clock hours of the hour lines, from hour_line_min to hour_line_max, or by
+    default covering the sunlit part of the day, as for the other dials (see
+    dial_extents.hour_line_range()), for which the sun can shine on the dial.
+    Returns (hours, x0, y0, dx, dy) arrays, as from dial_geometry.plane_hour_lines()."""
+    if hour_line_min is None or hour_line_max is None:
+        (auto_hour_line_min, auto_hour_line_max) = dial_extents.hour_line_range(location)
+        hour_line_min = auto_hour_line_min if hour_line_min is None else hour_line_min
+        hour_line_max = auto_hour_line_max if hour_line_max is None else hour_line_max
+    hours = np.arange(hour_line_min, hour_line_max + 1)
+    (x0, y0, dx, dy, lit) = dial_geometry.plane_hour_lines(hours, location, plane, style_height)
+    # Parallel hour lines of a polar dial run off to infinity towards 6 am and 6 pm.
+    keep = lit & (np.hypot(x0, y0) <= POLAR_EXTENT)
+    return (hours[keep], x0[keep], y0[keep], dx[keep], dy[keep])
+
+
+@instrument.timed('geometry')
+def layout(location, plane, hour_line_min=None, hour_line_max=None, limits=None, kind='planar',
+           style_height=POLAR_STYLE_HEIGHT):
+    """Calculate the layout of a dial for location on a dial_geometry.Plane.
+    The hour range defaults to the hours at which the sun can shine on the
+    dial, and limits to fitting the dial's contents.
+    Returns a dial_layout.DialLayout."""
+    site = dial_geometry.site_for(location)
+    hour_angle_logger = logging.getLogger("hour.angle.planar")
+    (hours, x0, y0, dx, dy) = dial_hours(site, plane, hour_line_min, hour_line_max, style_height)
+    ((substyle_x, substyle_y), style_angle) = dial_geometry.substyle(site, plane)
+    polar = np.isclose(style_angle, 0)
+    (line_start, line_end) = (-POLAR_HOUR_LINE_LENGTH, POLAR_HOUR_LINE_LENGTH) if polar else (0, HOUR_LINE_LENGTH)
+
+    hour_lines = []
+    numerals = []
+    with instrument.stage('planar.hour_lines', 'geometry', hours.size):
+        for (hour, x, y, direction_x, direction_y) in zip(hours, x0, y0, dx, dy):
+            hour_angle_logger.info("For hour %d, line angle %g", hour, np.rad2deg(np.arctan2(direction_y, direction_x)))
+            hour_lines.append(Segment(x + direction_x * line_start, y + direction_y * line_start,
+                                      x + direction_x * line_end, y + direction_y * line_end))
+            hour_text = "%d" % ((hour - 1) % 12 + 1)
+            numerals.append(Label(x + direction_x * (line_end + NUMERAL_GAP), y + direction_y * (line_end + NUMERAL_GAP),
+                                  hour_text, 'center', 'center'))
+
+    # The style, as seen from in front of the dial: along the substyle from
+    # its foot, or over the noon line of a polar dial. An equatorial dial's
+    # style is perpendicular to it, so is seen end-on.
+    if polar:
+        gnomon = Segment(-substyle_x * line_end, -substyle_y * line_end, substyle_x * line_end, substyle_y * line_end)
+    elif np.hypot(substyle_x, substyle_y) > 1e-9:
+        gnomon = Segment(0, 0, substyle_x * GNOMON_LENGTH, substyle_y * GNOMON_LENGTH)
+    else:
+        gnomon = None
+
+    dial = DialLayout(kind=kind,
+                      location=site.as_location(),
+                      limits=None,
+                      hour_lines=hour_lines,
+                      numerals=numerals,
+                      hour_points=[],
+                      ellipse_arc=None,
+                      date_scale_lines=[],
+                      date_scale_labels=[],
+                      date_lines=[],
+                      gnomon=gnomon,
+                      compass=None)
+    return dial._replace(limits=limits or dial_extents.layout_bounds(dial))
+
+
+def dial_drawer(layout_function):
+    """A draw_dial(fig, location, ...) function, drawing into the matplotlib
+    figure fig the layout from layout_function(location, ...), and returning
+    the axes drawn into."""
+    def draw_dial(fig, location, *args, **kwargs):
+        """Draw the dial for location into the matplotlib figure fig; the other
+        arguments are those of its layout(). Returns the axes drawn into."""
+        return dial_layout.draw_layout(fig, layout_function(location, *args, **kwargs))
+    return draw_dial
+
+
+# draw_dial(fig, location, plane, ...), for a dial on a dial_geometry.Plane.
+draw_dial = dial_drawer(layout)
+
+
+def show_dial(draw_dial_function, location, *args):
+    """Draw the dial for location with draw_dial_function(fig, location, *args)
+    in a matplotlib window, logging the hour line angles."""
+    from matplotlib import pyplot as plt
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    fig = plt.figure(num=location.location)
+    draw_dial_function(fig, location, *args)
+
+    plt.show()
+
+
+def main():
+    show_dial(draw_dial, LOCATION, PLANE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Calculation and generation of polar sundial.
+
+The dial's plane faces the equator, tilted to be parallel to the earth's
+axis, as is the style, which stands above the noon line. The hour lines are
+parallel, spaced as the tangent of the hour angle, from planar.layout().
+
+References:
+    http://en.wikipedia.org/wiki/Sundial#Polar_dials
+
+Dependencies:
+    - NumPy
+    - matplotlib (only to draw the dial)
+"""
+
+from dial_geometry import Location, Plane
+import planar
+
+
+LOCATION = Location(-37.81, 144.96, 10, 'Melbourne, Victoria, Australia')
+STYLE_HEIGHT = planar.POLAR_STYLE_HEIGHT
+
+
+def plane(location):
+    """The Plane of a polar dial at location."""
+    if location.latitude < 0:
+        return Plane(180, -location.latitude)
+    return Plane(0, location.latitude)
+
+
+def layout(location, hour_line_min=None, hour_line_max=None, style_height=STYLE_HEIGHT, limits=None):
+    """Calculate the layout of the polar sundial for location, with its style style_height above the dial.
+    The hour range defaults to the hours whose lines fall on the dial, and
+    limits to fitting the dial's contents.
+    Returns a dial_layout.DialLayout."""
+    return planar.layout(location, plane(location), hour_line_min, hour_line_max, limits, kind='polar',
+                         style_height=style_height)
+
+
+draw_dial = planar.dial_drawer(layout)
+
+
+def main():
+    planar.show_dial(draw_dial, LOCATION)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Calculation of the sun's position--equation of time, declination, right
+ascension and true anomaly--in one pass.
+
+The mean, eccentric and true anomaly chain, and the sine and cosine of the
+sun's ecliptic longitude, are computed once and shared by all the results.
+
+References:
+    http://en.wikipedia.org/wiki/Equation_of_time
+    http://en.wikipedia.org/wiki/Declination
+
+Dependencies:
+    - NumPy
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+import equation_of_time
+import instrument
+from equation_of_time import SUN_ANGLE_OFFSET, SUN_OBLIQUITY, DATE_PERIAPSIS
+
+
+# Named tuple to hold the results. All angles are in radians; the equation of
+# time is in minutes.
+SolarPosition = namedtuple('SolarPosition', 'equation_of_time, declination, right_ascension, true_anomaly')
+
+
+def day_number(dates, epoch=DATE_PERIAPSIS):
+    """Given an array of datetimes (or datetime64), return the number of days
+    from epoch, as float. Times are taken to be UTC."""
+    dates = np.asarray(dates, dtype='datetime64[us]')
+    return (dates - np.datetime64(epoch, 'us')) / np.timedelta64(1, 'D')
+
+
+@instrument.timed('solar', sized=True)
+def solar_position(day_number_n):
+    """Calculate the sun's position, given a day number.
+
+    day_number_n is the number of days from periapsis.
+    Returns a SolarPosition.
+    """
+    mean_anomaly_value = equation_of_time.mean_anomaly(day_number_n)
+    eccentric_anomaly_value = equation_of_time.eccentric_anomaly(mean_anomaly_value)
+    true_anomaly_value = equation_of_time.true_anomaly(eccentric_anomaly_value)
+
+    sun_angle = true_anomaly_value + SUN_ANGLE_OFFSET
+    sun_angle_x = np.cos(sun_angle)
+    sun_angle_y = np.sin(sun_angle)
+    right_ascension_value = np.arctan2(sun_angle_y * np.cos(SUN_OBLIQUITY), sun_angle_x)
+    declination_value = np.arcsin(sun_angle_y * np.sin(SUN_OBLIQUITY))
+
+    eot = mean_anomaly_value + SUN_ANGLE_OFFSET - right_ascension_value
+    # Get the angles into the range we want--that is, -pi to +pi
+    eot = (eot + np.pi) % (2 * np.pi) - np.pi
+    return SolarPosition(eot * (24 * 60 / 2 / np.pi), declination_value, right_ascension_value, true_anomaly_value)
+
+
+def solar_position_at(dates):
+    """Calculate the sun's position, given an array of datetimes (or datetime64), in UTC.
+    Returns a SolarPosition."""
+    return solar_position(day_number(dates))
+
+
+def main():
+    dates = np.arange(np.datetime64(equation_of_time.DATE_START), np.datetime64(equation_of_time.DATE_END), 7)
+    position = solar_position_at(dates)
+    for date, eot, declination in zip(dates, position.equation_of_time, position.declination):
+        print("%s  EoT %6.2f min  declination %6.2f deg" % (date, eot, np.rad2deg(declination)))
+
+
+if __name__ == '__main__':
+    main()
@@ -17,11 +17,15 @@ import datetime
 
 import numpy as np
 
+import equation_of_time
+import instrument
+import solar_position
 
-DAYS_PER_TROPICAL_YEAR = 365.242
+
+DAYS_PER_TROPICAL_YEAR = equation_of_time.DAYS_PER_TROPICAL_YEAR
 
 # Angle of tilt of earth's axis--about 23.44 degrees
-SUN_OBLIQUITY = 0.40910
+SUN_OBLIQUITY = equation_of_time.SUN_OBLIQUITY
 
 
 # Date range for drawing a graph.
@@ -30,6 +34,7 @@ DATE_END = datetime.date(2010, 1, 1)
 DATE_SOLSTICE = datetime.date(2008, 12, 21)
 
 
+@instrument.timed('solar', sized=True)
 def sun_declination_simple(day_number_n):
     """Calculate the sun's declination (in rad), given a day number.
     
@@ -40,8 +45,70 @@ def sun_declination_simple(day_number_n):
     return -SUN_OBLIQUITY * np.cos((2 * np.pi / DAYS_PER_TROPICAL_YEAR) * day_number_n)
 
 
+def _sun_declination_simple_block(day_number_block, out):
+    np.remainder(day_number_block, DAYS_PER_TROPICAL_YEAR, out=out, casting='same_kind')
+    out *= 2 * np.pi / DAYS_PER_TROPICAL_YEAR
+    np.cos(out, out=out)
+    out *= -SUN_OBLIQUITY
+
+
+@instrument.timed('solar', sized=True)
+def sun_declination_simple_bulk(day_number_n, out=None, dtype=np.float64, block_size=equation_of_time.BULK_BLOCK_SIZE,
+                                workers=1, chunk_size=equation_of_time.PARALLEL_CHUNK_SIZE):
+    """As sun_declination_simple(), for large arrays, with the result in dtype
+    (float32 or float64) or written into out, computed in place in blocks.
+    See equation_of_time.bulk_evaluate() for workers and chunk_size."""
+    return equation_of_time.bulk_evaluate(_sun_declination_simple_block, day_number_n, out, dtype, block_size,
+                                          workers, chunk_size)
+
+
+def sun_declination_simple_rate(day_number_n):
+    """Rate of change (in rad/day) of sun_declination_simple(), given a day number."""
+    angular_rate = 2 * np.pi / DAYS_PER_TROPICAL_YEAR
+    return SUN_OBLIQUITY * angular_rate * np.sin(angular_rate * day_number_n)
+
+
+@instrument.timed('solar', sized=True)
+def sun_declination_accurate(day_number_n):
+    """Calculate the sun's declination (in rad), given a day number.
+    
+    day_number_n is the number of days from solstice.
+    Returns the sun's declination, in radians.
+    This uses the more accurate calculation of solar_position.solar_position().
+    """
+    days_solstice_to_periapsis = (equation_of_time.DATE_PERIAPSIS - DATE_SOLSTICE).days
+    return solar_position.solar_position(day_number_n - days_solstice_to_periapsis).declination
+
+
+def sun_declination_accurate_rate(day_number_n):
+    """Rate of change (in rad/day) of sun_declination_accurate(), given a day number."""
+    days_solstice_to_periapsis = (equation_of_time.DATE_PERIAPSIS - DATE_SOLSTICE).days
+    position = solar_position.solar_position(day_number_n - days_solstice_to_periapsis)
+    local_sun_eccentricity = equation_of_time.SUN_ECCENTRICITY
+    # Kepler's second law gives the rate of change of the true anomaly.
+    true_anomaly_rate = ((2 * np.pi / DAYS_PER_TROPICAL_YEAR)
+                         * (1 + local_sun_eccentricity * np.cos(position.true_anomaly))**2
+                         / (1 - local_sun_eccentricity**2)**1.5)
+    sun_angle = position.true_anomaly + equation_of_time.SUN_ANGLE_OFFSET
+    return np.sin(SUN_OBLIQUITY) * np.cos(sun_angle) / np.cos(position.declination) * true_anomaly_rate
+
+
+def sunrise_hour_angle(latitude, declination, altitude=0.):
+    """Hour angle (in rad) from solar noon to sunrise or sunset, for the centre
+    of the sun at altitude (in rad; 0 is the horizon), given the latitude (in
+    degrees) and the sun's declination (in rad). It is 0 when the sun doesn't
+    rise, and pi when it doesn't set. latitude, declination and altitude may be
+    arrays, and are broadcast together."""
+    latitude = np.deg2rad(latitude)
+    cos_hour_angle = ((np.sin(altitude) - np.sin(latitude) * np.sin(declination))
+                      / (np.cos(latitude) * np.cos(declination)))
+    return np.arccos(np.clip(cos_hour_angle, -1, 1))
+
+
 sun_declination = sun_declination_simple
+sun_declination_rate = sun_declination_simple_rate
 #sun_declination = sun_declination_accurate
+#sun_declination_rate = sun_declination_accurate_rate
 
 
 def main():
@@ -55,7 +122,7 @@ def main():
     day_numbers = date_range - matplotlib.dates.date2num(DATE_SOLSTICE)
 
     # Plot the accurate and/or simple calculations of equation of time.
-#    plt.plot_date(date_range, np.rad2deg(sun_declination_accurate(day_numbers)), '-')
+    plt.plot_date(date_range, np.rad2deg(sun_declination_accurate(day_numbers)), '-')
     plt.plot_date(date_range, np.rad2deg(sun_declination_simple(day_numbers)), '--')
 
     # Set month lines
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Sunrise, sunset, solar noon, solar altitude and shadow lengths, through the
+year, for arrays of sites.
+
+Times are local clock (standard) time, in hours, including the equation of
+time and the longitude correction. Sunrise and sunset are for the top of the
+sun on the horizon, allowing for refraction, unless another altitude is
+given.
+
+An hour line of a dial is lit when the sun is up at that line's hour angle.
+The hour lines show mean time, so whether they are lit does not depend on the
+equation of time; lit_hour_range() gives the hour lines that are lit on some
+day of the year, which can be passed to horiz.layout() and
+analemmatic.layout() to leave out hour lines that are never lit.
+
+hour_range() gives either those hour lines, or, by default for the dial
+layouts (see dial_extents.hour_line_range()), those covering the sunlit part
+of the day: from the last hour line at or before the earliest sunrise to the
+first at or after the latest sunset. These can differ by an hour at each
+end. The covering range frames every position of the shadow between two
+hour lines, so the time can be read near sunrise and sunset; the lit range
+leaves out the lines the shadow never reaches.
+
+References:
+    http://en.wikipedia.org/wiki/Sunrise_equation
+
+Dependencies:
+    - NumPy
+"""
+
+from collections import namedtuple
+import datetime
+
+import numpy as np
+
+import dial_geometry
+from dial_geometry import Location
+import equation_of_time
+import solar_position
+import sun_declination
+
+
+# Altitude of the sun's centre at sunrise and sunset: the sun's semi-diameter
+# plus refraction at the horizon.
+SUNRISE_ALTITUDE = np.deg2rad(-0.833)
+
+# Days of the year: dates, and sunrise, sunset and solar noon (in hours, local
+# clock time) and the sun's altitude at solar noon (in rad). The times and
+# altitude have shape (sites, days), or (days,) for one site. When the sun
+# doesn't rise, sunrise and sunset are both solar noon; when it doesn't set,
+# they are 12 hours either side.
+SunTimes = namedtuple('SunTimes', 'dates, sunrise, sunset, solar_noon, max_altitude')
+
+
+def year_dates(year=2009):
+    """Every date of a year, as datetime64[D]."""
+    return np.arange(datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1), dtype='datetime64[D]')
+
+
+def _site_columns(location):
+    """A dial_geometry.Site, for a Location or Site, or with column array fields
+    for a sequence of Locations."""
+    if isinstance(location, (Location, dial_geometry.Site)):
+        return dial_geometry.site_for(location)
+    return dial_geometry.site_for(dial_geometry.location_grid(location))
+
+
+def _to_utc(dates, hour, location):
+    """UTC datetime64 of clock time hour on each of dates at location."""
+    return dates + ((hour - np.asarray(location.timezone, dtype=float)) * 3600e6).astype('timedelta64[us]')
+
+
+def _day_length_half(dates, location, altitude):
+    """Hours from solar noon to sunrise or sunset on each of dates, with the
+    declination at local noon."""
+    day_numbers = solar_position.day_number(_to_utc(dates, 12, location), sun_declination.DATE_SOLSTICE)
+    declination = sun_declination.sun_declination(day_numbers)
+    return (sun_declination.sunrise_hour_angle(location.latitude, declination, altitude) * 24 / (2 * np.pi),
+            declination)
+
+
+def sun_times(location, dates=None, altitude=SUNRISE_ALTITUDE):
+    """Calculate the sunrise, sunset, solar noon and noon altitude of the sun
+    for a Location (whose fields may be arrays) or a sequence of Locations, on
+    each of dates (datetime64 or datetime.date; default a whole year).
+    Returns a SunTimes."""
+    location = _site_columns(location)
+    dates = year_dates() if dates is None else np.asarray(dates, dtype='datetime64[D]')
+    eot_min = equation_of_time.equation_of_time(solar_position.day_number(_to_utc(dates, 12, location)))
+    (day_length_half, declination) = _day_length_half(dates, location, altitude)
+
+    solar_noon = dial_geometry.mean_solar_noon(location) - eot_min / 60
+    max_altitude = np.pi / 2 - np.abs(location.latitude_rad - declination)
+    return SunTimes(dates, solar_noon - day_length_half, solar_noon + day_length_half, solar_noon, max_altitude)
+
+
+def solar_altitude(hour, location, dates):
+    """The sun's altitude (in rad) at clock time hour on each of dates.
+    hour, the fields of location and dates are broadcast together."""
+    location = dial_geometry.site_for(location)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    utc = _to_utc(dates, hour, location)
+    eot_min = equation_of_time.equation_of_time(solar_position.day_number(utc))
+    declination = sun_declination.sun_declination(solar_position.day_number(utc, sun_declination.DATE_SOLSTICE))
+    hour_angle = (hour - dial_geometry.mean_solar_noon(location) + eot_min / 60) * (2 * np.pi / 24)
+    return np.arcsin(location.sin_latitude * np.sin(declination)
+                     + location.cos_latitude * np.cos(declination) * np.cos(hour_angle))
+
+
+def shadow_length(altitude, height=1.0):
+    """Length of the shadow of a vertical gnomon of height, on level ground,
+    for the sun at altitude (in rad). inf when the sun is not up."""
+    with np.errstate(divide='ignore'):
+        return np.where(altitude > 0, height / np.tan(np.maximum(altitude, 0)), np.inf)
+
+
+def hour_lines_lit(hours, location, dates=None, altitude=SUNRISE_ALTITUDE):
+    """Whether the hour line for each of hours (clock hours, of mean time) is
+    lit on each of dates. location is a Location or a sequence of them.
+    Returns a bool array of shape (sites, days, hours), or (days, hours) for one site."""
+    location = _site_columns(location)
+    dates = year_dates() if dates is None else np.asarray(dates, dtype='datetime64[D]')
+    (day_length_half, declination) = _day_length_half(dates, location, altitude)
+    hours_from_noon = np.asarray(hours) - dial_geometry.mean_solar_noon(location)[..., np.newaxis]
+    return np.abs(hours_from_noon) <= day_length_half[..., np.newaxis]
+
+
+def hour_range(location, dates=None, altitude=SUNRISE_ALTITUDE, covering=False):
+    """Clock hours (hour_line_min, hour_line_max) of the first and last hour
+    lines for the sunlit part of the day on any of dates (default a whole
+    year), for a Location or a sequence of them: those that are lit, or if
+    covering is True, those covering the earliest sunrise and latest sunset.
+    Returns ints, or arrays of them for several sites."""
+    location = _site_columns(location)
+    dates = year_dates() if dates is None else np.asarray(dates, dtype='datetime64[D]')
+    (day_length_half, declination) = _day_length_half(dates, location, altitude)
+    day_length_half = np.max(day_length_half, axis=-1, keepdims=True)
+    noon = dial_geometry.mean_solar_noon(location)
+    (first, last) = (np.floor, np.ceil) if covering else (np.ceil, np.floor)
+    hour_line_min = first(noon - day_length_half).astype(int)[..., 0]
+    # In a polar summer the sun never sets; take a whole day of hour lines,
+    # without repeating the first a day later.
+    hour_line_max = np.minimum(last(noon + day_length_half).astype(int)[..., 0], hour_line_min + 23)
+    if np.ndim(hour_line_min) == 0:
+        return (int(hour_line_min), int(hour_line_max))
+    return (hour_line_min, hour_line_max)
+
+
+def lit_hour_range(location, dates=None, altitude=SUNRISE_ALTITUDE):
+    """Clock hours (hour_line_min, hour_line_max) of the first and last hour
+    lines that are lit on any of dates (default a whole year), for a Location
+    or a sequence of them. Returns ints, or arrays of them for several sites."""
+    return hour_range(location, dates, altitude)
+
+
+def main():
+    import sys
+
+    locations = [Location(-37.81, 144.96, 10, 'Melbourne, Victoria, Australia'),
+                 Location(35.10, 138.86, 9, 'Numazu, Japan'),
+                 Location(51.3809, -2.3603, 0, 'Bath, England')]
+    times = sun_times(locations)
+    (hour_line_min, hour_line_max) = lit_hour_range(locations)
+    for (index, location) in enumerate(locations):
+        sys.stdout.write("%s\n" % location.location)
+        sys.stdout.write("    earliest sunrise %5.2f h, latest sunset %5.2f h\n"
+                         % (times.sunrise[index].min(), times.sunset[index].max()))
+        sys.stdout.write("    noon altitude %.1f to %.1f deg, noon shadow length %.2f to %.2f\n"
+                         % (np.rad2deg(times.max_altitude[index].min()), np.rad2deg(times.max_altitude[index].max()),
+                            shadow_length(times.max_altitude[index].max()), shadow_length(times.max_altitude[index].min())))
+        sys.stdout.write("    lit hour lines %d to %d\n" % (hour_line_min[index], hour_line_max[index]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Parameter sweeps of dial proportions, for design-space exploration.
+
+Every combination of latitude, longitude, hour range (hour_line_min and
+hour_line_max), extents (extent_major and extent_minor) and NUMERAL_OFFSET
+is evaluated, for the horizontal or the analemmatic dial,
+using the geometry of horiz.py and analemmatic.py. For each configuration
+the result gives:
+
+    - the bounding box of the dial's contents (hour lines or hour points,
+      numerals, and the analemmatic date scale)
+    - the minimum distance between neighbouring numerals, where small values
+      mean colliding numerals
+    - the fraction of the area within the extents that the contents leave
+      unused
+    - whether any numeral falls outside the extents
+
+Configurations are evaluated as arrays, in chunks, across a pool of
+processes. Results are saved as a .npz file of columns, one element per
+configuration, with the swept values of each parameter also saved as
+'axis_<name>'. Each location's time zone is taken to be that of the nearest
+15 degree meridian.
+
+Dependencies:
+    - NumPy
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+
+import numpy as np
+
+import analemmatic
+from dial_geometry import Location
+import horiz
+import sun_declination
+
+
+DIAL_NAMES = ('horiz', 'analemmatic')
+# Swept parameters, in order; configuration index i is np.unravel_index(i) over these axes.
+PARAMETERS = ('latitude', 'longitude', 'hour_line_min', 'hour_line_max', 'extent_major', 'extent_minor', 'numeral_offset')
+RESULTS = ('x_min', 'x_max', 'y_min', 'y_max', 'numeral_spacing_min', 'unused_fraction', 'clipped')
+# Every hour that can be on a dial. Hours outside each configuration's range are masked out.
+HOURS = np.arange(0, 24 + 1)
+# Number of configurations evaluated at once by each worker.
+CHUNK_SIZE = 1 << 15
+
+
+def default_axes(dial_name):
+    """A default grid of about 1.7 million configurations around the dial's current settings."""
+    dial_module = horiz if dial_name == 'horiz' else analemmatic
+    return {
+        'latitude': np.concatenate([np.linspace(-65, -10, 12), np.linspace(10, 65, 12)]),
+        'longitude': np.linspace(-7.5, 7.5, 5),
+        'hour_line_min': np.arange(3, 9),
+        'hour_line_max': np.arange(16, 22),
+        'extent_major': np.linspace(1.0, 1.4, 9),
+        'extent_minor': np.linspace(0.5, 1.2, 9),
+        'numeral_offset': dial_module.NUMERAL_OFFSET + np.linspace(-0.05, 0.05, 5),
+    }
+
+
+def configurations(axes, start, stop):
+    """Parameter columns for configuration indices start up to stop of the grid over axes."""
+    indices = np.unravel_index(np.arange(start, stop), [len(axes[name]) for name in PARAMETERS])
+    return dict((name, np.asarray(axes[name], dtype=float)[index]) for (name, index) in zip(PARAMETERS, indices))
+
+
+def evaluate(dial_name, config):
+    """Evaluate configurations given as a dict of parameter columns.
+    Returns a dict of result columns."""
+    column = lambda name: config[name][:, np.newaxis]
+    location = Location(column('latitude'), column('longitude'), np.round(column('longitude') / 15), None)
+    in_range = (HOURS >= column('hour_line_min')) & (HOURS <= column('hour_line_max'))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if dial_name == 'horiz':
+            angle = horiz.dial_hour_angle(HOURS, location)
+            (point_x, point_y) = (np.cos(angle), np.sin(angle))
+            # Hour lines run from the origin to the hour points.
+            fixed_x = np.zeros_like(column('latitude'))
+            fixed_y = fixed_x
+            limits = (-column('extent_major'), column('extent_major'), -column('extent_minor'), column('extent_major'))
+        else:
+            (point_x, point_y) = analemmatic.dial_hour_position(HOURS, location)
+            # The date scale runs between the y positions for the solstices.
+            date_scale_y = np.tan(sun_declination.SUN_OBLIQUITY) * np.cos(np.deg2rad(column('latitude')))
+            fixed_x = np.full_like(date_scale_y, analemmatic.DATE_SCALE_X_EXTENT) * [-1, 1]
+            fixed_y = date_scale_y * [-1, 1]
+            limits = (-column('extent_major'), column('extent_major'), -column('extent_minor'), column('extent_minor'))
+        numeral_x = point_x * column('numeral_offset')
+        numeral_y = point_y * column('numeral_offset')
+
+    # Bounding box of the hour points and numerals in range, and the fixed points.
+    hours_x = np.concatenate([point_x, numeral_x], axis=1)
+    hours_y = np.concatenate([point_y, numeral_y], axis=1)
+    hours_in_range = np.concatenate([in_range, in_range], axis=1)
+    x_min = np.minimum(np.where(hours_in_range, hours_x, np.inf).min(axis=1), fixed_x.min(axis=1))
+    x_max = np.maximum(np.where(hours_in_range, hours_x, -np.inf).max(axis=1), fixed_x.max(axis=1))
+    y_min = np.minimum(np.where(hours_in_range, hours_y, np.inf).min(axis=1), fixed_y.min(axis=1))
+    y_max = np.maximum(np.where(hours_in_range, hours_y, -np.inf).max(axis=1), fixed_y.max(axis=1))
+
+    # Numerals are in order around the dial, so the closest are neighbours.
+    spacing = np.hypot(np.diff(numeral_x, axis=1), np.diff(numeral_y, axis=1))
+    spacing = np.where(in_range[:, 1:] & in_range[:, :-1], spacing, np.inf).min(axis=1)
+
+    (limit_x_min, limit_x_max, limit_y_min, limit_y_max) = [limit[:, 0] for limit in limits]
+    limits_area = (limit_x_max - limit_x_min) * (limit_y_max - limit_y_min)
+    used_x = np.clip(np.minimum(x_max, limit_x_max) - np.maximum(x_min, limit_x_min), 0, None)
+    used_y = np.clip(np.minimum(y_max, limit_y_max) - np.maximum(y_min, limit_y_min), 0, None)
+    outside = ((numeral_x < limits[0]) | (numeral_x > limits[1]) | (numeral_y < limits[2]) | (numeral_y > limits[3])) & in_range
+
+    return {
+        'x_min': x_min.astype(np.float32),
+        'x_max': x_max.astype(np.float32),
+        'y_min': y_min.astype(np.float32),
+        'y_max': y_max.astype(np.float32),
+        'numeral_spacing_min': spacing.astype(np.float32),
+        'unused_fraction': (1 - used_x * used_y / limits_area).astype(np.float32),
+        'clipped': outside.any(axis=1),
+    }
+
+
+def evaluate_chunk(job):
+    """Evaluate one chunk of the grid, for the process pool. job is
+    (dial_name, axes, start, stop). Returns (start, results)."""
+    (dial_name, axes, start, stop) = job
+    return (start, evaluate(dial_name, configurations(axes, start, stop)))
+
+
+def _store(columns, start, results):
+    for name in RESULTS:
+        columns[name][start:start + len(results[name])] = results[name]
+
+
+def sweep(dial_name, axes, workers=None, chunk_size=CHUNK_SIZE):
+    """Evaluate every configuration of the grid over axes, a dict of parameter
+    name to swept values, across workers processes (or in this process if
+    workers is 1). Returns a dict of parameter and result columns."""
+    total = int(np.prod([len(axes[name]) for name in PARAMETERS]))
+    columns = configurations(axes, 0, total)
+    for name in PARAMETERS:
+        columns[name] = columns[name].astype(np.float32)
+    for name in RESULTS:
+        columns[name] = np.empty(total, dtype=bool if name == 'clipped' else np.float32)
+
+    jobs = [(dial_name, axes, start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+    if workers == 1:
+        for (start, results) in map(evaluate_chunk, jobs):
+            _store(columns, start, results)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for (start, results) in executor.map(evaluate_chunk, jobs):
+                _store(columns, start, results)
+    return columns
+
+
+def save(path, dial_name, axes, columns):
+    """Save sweep results as a compressed .npz file of columns."""
+    arrays = dict(columns)
+    arrays.update(('axis_' + name, np.asarray(axes[name])) for name in PARAMETERS)
+    np.savez_compressed(path, dial=np.array(dial_name), **arrays)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep sundial proportions over a grid of parameters.")
+    parser.add_argument('dial', choices=DIAL_NAMES)
+    parser.add_argument('output', help=".npz file for the results")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="number of worker processes (default one per CPU)")
+    args = parser.parse_args()
+
+    axes = default_axes(args.dial)
+    start_time = time.perf_counter()
+    columns = sweep(args.dial, axes, args.workers)
+    seconds = time.perf_counter() - start_time
+    save(args.output, args.dial, axes, columns)
+
+    total = len(columns['clipped'])
+    print("%d configurations in %.3f s, on %d processes" % (total, seconds, args.workers or os.cpu_count() or 1))
+    print("%d with numerals outside the extents" % np.count_nonzero(columns['clipped']))
+    usable = ~columns['clipped']
+    if usable.any():
+        best = np.flatnonzero(usable)[np.argmin(columns['unused_fraction'][usable])]
+        print("Least unused space, without clipping: %s" % ', '.join(
+            '%s %g' % (name, columns[name][best]) for name in PARAMETERS + ('numeral_spacing_min', 'unused_fraction')))
+
+
+if __name__ == '__main__':
+    main()
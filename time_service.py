@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Local HTTP service converting between sundial (apparent solar) time and clock time.
+
+Solar time differs from clock time by the equation of time, plus the
+correction for the location's longitude from its time zone's meridian.
+
+POST /convert with a JSON body--one request object, or a list of them for a
+batch--such as:
+
+    {"longitude": 144.96, "timezone": 10,
+     "time": "2009-02-11T12:00:00", "direction": "clock_to_solar"}
+
+"time" is local clock time for "clock_to_solar", or local solar time for
+"solar_to_clock". A clock time may have a UTC offset, or "Z", and is then
+converted to the time zone of "timezone"; a solar time may not. "latitude"
+may be given too, but the correction doesn't depend on it. Each response object gives the converted "time", and
+"offset_min", the solar time minus clock time in minutes.
+
+GET /stats returns request counts and p50/p99 latencies.
+
+The offset for each location is cached at the start of each UTC day, with
+least recently used days evicted, and interpolated within the day. The
+server listens on localhost, or on a Unix socket, only.
+
+Dependencies:
+    - NumPy
+"""
+
+import argparse
+import asyncio
+from collections import OrderedDict, deque
+import datetime
+import json
+import time
+
+import numpy as np
+
+import dial_geometry
+from dial_geometry import Location
+import equation_of_time
+
+
+# Days cached per location, and number of locations cached.
+CACHE_DAYS_PER_LOCATION = 400
+CACHE_LOCATIONS = 1000
+# Number of recent request latencies kept for the percentile counters.
+LATENCY_WINDOW = 10000
+
+DIRECTIONS = ('clock_to_solar', 'solar_to_clock')
+# Largest time zone offset accepted, in hours.
+MAX_TIMEZONE_HOURS = 24
+
+
+class DayCache(object):
+    """Per-location cache of the solar time offset at the start of each UTC day,
+    with least recently used days, and locations, evicted.
+    Sites are keyed by (longitude, timezone)."""
+
+    def __init__(self, days_per_location=CACHE_DAYS_PER_LOCATION, locations=CACHE_LOCATIONS):
+        self.days_per_location = days_per_location
+        self.locations = locations
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def offset_min(self, site, utc_days):
+        """Solar time minus clock time (in min) for a dial_geometry.Site at the
+        given times, as float days since equation_of_time.DATE_PERIAPSIS,
+        interpolated from the cached values at day starts."""
+        location_key = (site.longitude, site.timezone)
+        days = self.cache.get(location_key)
+        if days is None:
+            days = self.cache[location_key] = OrderedDict()
+            if len(self.cache) > self.locations:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(location_key)
+
+        day_starts = np.floor(utc_days)
+        wanted = np.union1d(day_starts, day_starts + 1)
+        missing = [day for day in wanted if day not in days]
+        self.hits += len(wanted) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            offsets = equation_of_time.equation_of_time(np.array(missing)) + site.clock_offset_min
+            for (day, offset) in zip(missing, offsets):
+                days[day] = float(offset)
+        for day in wanted:
+            days.move_to_end(day)
+        while len(days) > self.days_per_location:
+            days.popitem(last=False)
+
+        offset_start = np.array([days[day] for day in day_starts])
+        offset_end = np.array([days[day + 1] for day in day_starts])
+        return offset_start + (offset_end - offset_start) * (utc_days - day_starts)
+
+
+def _days_from_periapsis(utc_datetime):
+    return (utc_datetime - datetime.datetime.combine(equation_of_time.DATE_PERIAPSIS, datetime.time())).total_seconds() / 86400.
+
+
+class TimeCorrectionService(object):
+    """Converts between solar time and clock time, keeping latency counters."""
+
+    def __init__(self, cache=None):
+        self.cache = cache or DayCache()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.conversions = 0
+
+    def offset_min(self, site, utc_datetime):
+        """Solar time minus clock time (in min) for a dial_geometry.Site at a UTC time."""
+        return float(self.cache.offset_min(site, np.array([_days_from_periapsis(utc_datetime)]))[0])
+
+    def convert_one(self, request):
+        """Convert one request object, returning the response object."""
+        longitude = float(request['longitude'])
+        timezone = float(request['timezone'])
+        if not abs(timezone) <= MAX_TIMEZONE_HOURS:
+            raise ValueError("timezone must be within %g hours of UTC" % MAX_TIMEZONE_HOURS)
+        site = dial_geometry.site_for(Location(float(request.get('latitude', 0)), longitude, timezone, None))
+        direction = request.get('direction', 'clock_to_solar')
+        if direction not in DIRECTIONS:
+            raise ValueError("direction must be one of %s" % ', '.join(DIRECTIONS))
+        local_time = datetime.datetime.fromisoformat(request['time'])
+        zone = datetime.timedelta(hours=timezone)
+        if local_time.utcoffset() is not None:
+            if direction != 'clock_to_solar':
+                raise ValueError("solar time must not have a UTC offset")
+            local_time = local_time.astimezone(datetime.timezone.utc).replace(tzinfo=None) + zone
+
+        if direction == 'clock_to_solar':
+            offset = self.offset_min(site, local_time - zone)
+            result = local_time + datetime.timedelta(minutes=offset)
+        else:
+            # The offset depends on the clock time being solved for, but only
+            # slowly, so a couple of fixed-point iterations converge.
+            offset = site.clock_offset_min
+            for _ in range(3):
+                clock_time = local_time - datetime.timedelta(minutes=offset)
+                offset = self.offset_min(site, clock_time - zone)
+            result = local_time - datetime.timedelta(minutes=offset)
+        return {'time': result.isoformat(), 'offset_min': offset}
+
+    def convert(self, body):
+        """Convert a request object, or a list of them, timing the request."""
+        start_time = time.perf_counter()
+        try:
+            if isinstance(body, list):
+                self.conversions += len(body)
+                return [self.convert_one(request) for request in body]
+            self.conversions += 1
+            return self.convert_one(body)
+        finally:
+            self.requests += 1
+            self.latencies.append(time.perf_counter() - start_time)
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1e3
+        return {
+            'requests': self.requests,
+            'conversions': self.conversions,
+            'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+        }
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection, with keep-alive."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                (method, path) = request_line.decode('latin-1').split()[:2]
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode('latin-1').strip()
+                    if not line:
+                        break
+                    (name, _, value) = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                (status, response) = self.route(method, path, body)
+                payload = json.dumps(response).encode('utf-8')
+                writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n'
+                             % (status, b'OK' if status == 200 else b'Error', len(payload)) + payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def route(self, method, path, body):
+        """Return (HTTP status, response object) for a request."""
+        if method == 'POST' and path == '/convert':
+            try:
+                return (200, self.convert(json.loads(body)))
+            except (KeyError, TypeError, ValueError, OverflowError) as e:
+                # OverflowError is from times converted beyond the range of datetime.
+                return (400, {'error': str(e)})
+        if method == 'GET' and path == '/stats':
+            return (200, self.stats())
+        return (404, {'error': "not found"})
+
+
+async def serve(service, host='127.0.0.1', port=8000, unix_path=None):
+    """Run the service until cancelled, on a Unix socket if unix_path is given,
+    otherwise on host and port."""
+    if unix_path:
+        server = await asyncio.start_unix_server(service.handle_connection, path=unix_path)
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local solar time <-> clock time service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix', help="listen on this Unix socket path instead")
+    args = parser.parse_args()
+    asyncio.run(serve(TimeCorrectionService(), args.host, args.port, args.unix))
+
+
+if __name__ == '__main__':
+    main()
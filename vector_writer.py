@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Direct SVG and DXF output of sundial layouts, for laser cutters and plotters.
+
+Hour lines, numerals, hour points, the ellipse arc, the date scale, date
+lines, the gnomon and the compass arrow of a dial_layout.DialLayout are
+streamed straight to any file-like object, without going through matplotlib.
+Output is in dial units (the hour line length is 1) scaled to millimetres.
+
+DXF output uses only R12 entities (LINE, CIRCLE, TEXT and POLYLINE), so it
+reads in nearly every CAD and laser-cutter program; the ellipse arc is written
+as a polyline.
+
+Dependencies:
+    - NumPy
+"""
+
+import io
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from dial_geometry import ellipse_arc_parameters, ellipse_arc_points
+import instrument
+
+
+# Millimetres per dial unit.
+SCALE_MM = 100.0
+# Sizes, in dial units.
+TEXT_HEIGHT = 0.06
+LINE_WIDTH = 0.004
+POINT_RADIUS = 0.01
+# Number of polyline segments for the DXF ellipse arc, per degree of arc.
+ARC_SEGMENTS_PER_DEGREE = 0.5
+
+# Shape of matplotlib's patches.Arrow, for an arrow of length 1 and width 1 along the x axis.
+ARROW_SHAPE = np.array([[0.0, 0.1], [0.0, -0.1], [0.8, -0.1], [0.8, -0.3], [1.0, 0.0], [0.8, 0.3], [0.8, 0.1]])
+
+SVG_TEXT_ANCHOR = {'left': 'start', 'center': 'middle', 'right': 'end'}
+SVG_BASELINE = {'top': 'hanging', 'center': 'central', 'baseline': 'auto', 'bottom': 'text-after-edge'}
+DXF_HALIGN = {'left': 0, 'center': 1, 'right': 2}
+DXF_VALIGN = {'baseline': 0, 'bottom': 1, 'center': 2, 'top': 3}
+
+
+def _text_writer(f):
+    """Return a function writing str to f, which may be a text or binary file-like object."""
+    if isinstance(f, (io.RawIOBase, io.BufferedIOBase)) or 'b' in getattr(f, 'mode', ''):
+        return lambda s: f.write(s.encode('utf-8'))
+    return f.write
+
+
+def _num(value):
+    """Compact formatting of a coordinate."""
+    s = ('%.4f' % value).rstrip('0').rstrip('.')
+    return '0' if s == '-0' else s
+
+
+def arrow_polygon(arrow):
+    """Outline (x, y arrays) of a dial_layout.Arrow, the same shape as matplotlib draws."""
+    length = np.hypot(arrow.dx, arrow.dy)
+    direction = np.arctan2(arrow.dy, arrow.dx)
+    x = ARROW_SHAPE[:, 0] * length
+    y = ARROW_SHAPE[:, 1] * arrow.width
+    return (arrow.x + x * np.cos(direction) - y * np.sin(direction),
+            arrow.y + x * np.sin(direction) + y * np.cos(direction))
+
+
+def _layout_lines(layout):
+    """All the straight lines of a layout, in drawing order."""
+    lines = list(layout.hour_lines) + list(layout.date_scale_lines)
+    if layout.gnomon is not None:
+        lines.append(layout.gnomon)
+    return lines
+
+
+def _layout_labels(layout):
+    """All the text labels of a layout."""
+    labels = list(layout.numerals) + list(layout.date_scale_labels)
+    if layout.compass is not None:
+        labels.append(layout.compass.label)
+    return labels
+
+
+def write_svg(layout, f, scale=SCALE_MM):
+    """Write a dial_layout.DialLayout to f as SVG, scale millimetres per dial unit."""
+    write = _text_writer(f)
+    (x_min, x_max, y_min, y_max) = layout.limits
+    # SVG's y axis points down; dial y coordinates are negated throughout.
+    write('<?xml version="1.0" encoding="utf-8"?>\n'
+          '<svg xmlns="http://www.w3.org/2000/svg" width="%smm" height="%smm" viewBox="%s %s %s %s">\n'
+          % (_num((x_max - x_min) * scale), _num((y_max - y_min) * scale),
+             _num(x_min), _num(-y_max), _num(x_max - x_min), _num(y_max - y_min)))
+    write('<g fill="none" stroke="black" stroke-width="%s" stroke-linecap="round">\n' % _num(LINE_WIDTH))
+    if layout.ellipse_arc is not None:
+        (rx, ry, rotation, start, sweep) = ellipse_arc_parameters(layout.ellipse_arc)
+        (x, y) = ellipse_arc_points(layout.ellipse_arc, np.array([start, start + sweep]))
+        # The arc is anticlockwise in dial coordinates, so clockwise (sweep flag 0) once y is negated.
+        write('<path d="M%s %sA%s %s %s %d 0 %s %s"/>\n'
+              % (_num(x[0]), _num(-y[0]), _num(rx), _num(ry), _num(-np.rad2deg(rotation)),
+                 sweep > np.pi, _num(x[1]), _num(-y[1])))
+    for line in _layout_lines(layout):
+        write('<path d="M%s %sL%s %s"/>\n' % (_num(line.x0), _num(-line.y0), _num(line.x1), _num(-line.y1)))
+    for polyline in layout.date_lines:
+        write('<path d="M%s"/>\n' % 'L'.join('%s %s' % (_num(x), _num(-y)) for (x, y) in polyline))
+    write('</g>\n')
+
+    for (x, y) in layout.hour_points:
+        write('<circle cx="%s" cy="%s" r="%s"/>\n' % (_num(x), _num(-y), _num(POINT_RADIUS)))
+    if layout.compass is not None:
+        (x, y) = arrow_polygon(layout.compass.arrow)
+        write('<polygon points="%s"/>\n' % ' '.join('%s,%s' % (_num(px), _num(-py)) for (px, py) in zip(x, y)))
+
+    write('<g font-family="sans-serif" font-size="%s">\n' % _num(TEXT_HEIGHT))
+    for label in _layout_labels(layout):
+        write('<text x="%s" y="%s" text-anchor="%s" dominant-baseline="%s">%s</text>\n'
+              % (_num(label.x), _num(-label.y), SVG_TEXT_ANCHOR[label.ha], SVG_BASELINE[label.va], escape(label.text)))
+    write('</g>\n</svg>\n')
+
+
+def _dxf_polyline(write, x, y, closed=False):
+    write('0\nPOLYLINE\n8\n0\n66\n1\n70\n%d\n' % (1 if closed else 0))
+    for (px, py) in zip(x, y):
+        write('0\nVERTEX\n8\n0\n10\n%s\n20\n%s\n' % (_num(px), _num(py)))
+    write('0\nSEQEND\n8\n0\n')
+
+
+def write_dxf(layout, f, scale=SCALE_MM):
+    """Write a dial_layout.DialLayout to f as DXF, scale millimetres per dial unit."""
+    write = _text_writer(f)
+    write('0\nSECTION\n2\nENTITIES\n')
+    if layout.ellipse_arc is not None:
+        (rx, ry, rotation, start, sweep) = ellipse_arc_parameters(layout.ellipse_arc)
+        segments = max(2, int(np.ceil(np.rad2deg(sweep) * ARC_SEGMENTS_PER_DEGREE)))
+        (x, y) = ellipse_arc_points(layout.ellipse_arc, np.linspace(start, start + sweep, segments + 1))
+        _dxf_polyline(write, x * scale, y * scale)
+    for line in _layout_lines(layout):
+        write('0\nLINE\n8\n0\n10\n%s\n20\n%s\n11\n%s\n21\n%s\n'
+              % (_num(line.x0 * scale), _num(line.y0 * scale), _num(line.x1 * scale), _num(line.y1 * scale)))
+    for polyline in layout.date_lines:
+        _dxf_polyline(write, [x * scale for (x, y) in polyline], [y * scale for (x, y) in polyline])
+    for (x, y) in layout.hour_points:
+        write('0\nCIRCLE\n8\n0\n10\n%s\n20\n%s\n40\n%s\n' % (_num(x * scale), _num(y * scale), _num(POINT_RADIUS * scale)))
+    if layout.compass is not None:
+        (x, y) = arrow_polygon(layout.compass.arrow)
+        _dxf_polyline(write, x * scale, y * scale, closed=True)
+    for label in _layout_labels(layout):
+        # With non-default justification, the text is placed at the second alignment point.
+        write('0\nTEXT\n8\n0\n10\n%s\n20\n%s\n40\n%s\n1\n%s\n72\n%d\n11\n%s\n21\n%s\n73\n%d\n'
+              % (_num(label.x * scale), _num(label.y * scale), _num(TEXT_HEIGHT * scale), label.text,
+                 DXF_HALIGN[label.ha], _num(label.x * scale), _num(label.y * scale), DXF_VALIGN[label.va]))
+    write('0\nENDSEC\n0\nEOF\n')
+
+
+WRITERS = {
+    'svg': write_svg,
+    'dxf': write_dxf,
+}
+
+
+@instrument.timed('write')
+def save(layout, path, scale=SCALE_MM):
+    """Write a layout to a file, SVG or DXF according to the file name extension."""
+    writer = WRITERS[path.rsplit('.', 1)[-1].lower()]
+    with open(path, 'w', encoding='utf-8') as f:
+        writer(layout, f, scale)
+
+
+def main():
+    import sys
+
+    from dials import DIAL_MODULES
+
+    if len(sys.argv) != 3 or sys.argv[1] not in DIAL_MODULES:
+        sys.exit("usage: vector_writer.py %s output.svg|output.dxf" % '|'.join(DIAL_MODULES))
+    dial_module = DIAL_MODULES[sys.argv[1]]
+    save(dial_module.layout(dial_module.LOCATION), sys.argv[2])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Calculation and generation of vertical sundial, on a wall facing in any direction.
+
+A wall's declination is the direction it faces, clockwise from south
+(positive to the west), in degrees. By default, the wall faces the equator:
+south in the northern hemisphere, north in the southern. The hour lines are
+from planar.layout().
+
+References:
+    http://en.wikipedia.org/wiki/Sundial#Vertical_declining_dials
+
+Dependencies:
+    - NumPy
+    - matplotlib (only to draw the dial)
+"""
+
+from dial_geometry import Location, Plane
+import planar
+
+
+LOCATION = Location(-37.81, 144.96, 10, 'Melbourne, Victoria, Australia')
+# Declination of the wall, or None for a wall facing the equator.
+DECLINATION = None
+
+
+def plane(location, declination=None):
+    """The Plane of a vertical wall at location, facing declination, or the equator."""
+    if declination is None:
+        declination = 180 if location.latitude < 0 else 0
+    return Plane(declination, 90)
+
+
+def layout(location, hour_line_min=None, hour_line_max=None, declination=DECLINATION, limits=None):
+    """Calculate the layout of the vertical sundial for location, on a wall facing declination.
+    The hour range defaults to the hours at which the sun can shine on the
+    wall, and limits to fitting the dial's contents.
+    Returns a dial_layout.DialLayout."""
+    return planar.layout(location, plane(location, declination), hour_line_min, hour_line_max, limits, kind='vertical')
+
+
+draw_dial = planar.dial_drawer(layout)
+
+
+def main():
+    planar.show_dial(draw_dial, LOCATION)
+
+
+if __name__ == '__main__':
+    main()